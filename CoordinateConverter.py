@@ -4,6 +4,153 @@ import pandas as pd
 from pyproj import Transformer, CRS
 import os
 
+# CGCS2000经度带选项
+CGCS2000_ZONES = [
+    "CGCS2000 108°E", "CGCS2000 111°E", "CGCS2000 114°E", 
+    "CGCS2000 117°E", "CGCS2000 120°E", "CGCS2000 123°E"
+]
+ALL_CRS_OPTIONS = CGCS2000_ZONES + ["WGS1984"]
+
+
+def get_cgcs2000_crs_string(zone_name):
+    """根据经度带名称生成CGCS2000 CRS字符串"""
+    # 提取经度值
+    lon_value = int(zone_name.split(" ")[1].replace("°E", ""))
+    
+    # CGCS2000 3度带投影参数
+    crs_string = (
+        f"+proj=tmerc +lat_0=0 +lon_0={lon_value} "
+        f"+k=1 +x_0=500000 +y_0=0 "
+        f"+ellps=GRS80 +units=m +no_defs"
+    )
+    return crs_string
+
+
+def get_crs_definition(crs_name):
+    """获取坐标系定义"""
+    if crs_name == "WGS1984":
+        return "EPSG:4326"
+    elif crs_name.startswith("CGCS2000"):
+        return get_cgcs2000_crs_string(crs_name)
+    else:
+        return None
+
+
+def read_excel_file(file_path, log=print):
+    """增强的Excel文件读取函数，支持多种格式和错误处理"""
+    try:
+        # 首先尝试使用openpyxl引擎读取.xlsx文件
+        if file_path.endswith('.xlsx'):
+            try:
+                df = pd.read_excel(file_path, engine='openpyxl')
+                return df
+            except Exception as e:
+                log(f"使用openpyxl读取失败: {str(e)}")
+                # 如果openpyxl失败，尝试使用xlrd引擎
+                try:
+                    df = pd.read_excel(file_path, engine='xlrd')
+                    return df
+                except Exception as e2:
+                    log(f"使用xlrd读取失败: {str(e2)}")
+                    raise e2
+        # 对于.xls文件，使用xlrd引擎
+        elif file_path.endswith('.xls'):
+            df = pd.read_excel(file_path, engine='xlrd')
+            return df
+        else:
+            # 尝试自动检测
+            try:
+                df = pd.read_excel(file_path, engine='openpyxl')
+                return df
+            except:
+                df = pd.read_excel(file_path, engine='xlrd')
+                return df
+    except Exception as e:
+        log(f"读取Excel文件时出错: {str(e)}")
+        raise e
+
+
+class ConversionInputError(ValueError):
+    """输入文件不满足转换要求（缺少列、没有有效数据等）"""
+
+
+def convert_coordinate_file(input_path, output_path, source_crs, target_crs, log=print):
+    """将Excel文件中的X、Y列从源坐标系转换到目标坐标系并保存
+
+    source_crs、target_crs 为 ALL_CRS_OPTIONS 中的名称。输出文件删除原X、Y列，
+    增加X_new、Y_new列。输入不满足要求时抛出 ConversionInputError。
+    该函数不依赖图形界面，log 为接收日志文字的回调。
+    """
+    # 获取坐标系定义
+    source_crs_def = get_crs_definition(source_crs)
+    target_crs_def = get_crs_definition(target_crs)
+    
+    if not source_crs_def or not target_crs_def:
+        raise ConversionInputError("无法识别的坐标系统")
+    
+    log("开始读取Excel文件...")
+    
+    # 读取Excel文件，使用增强的读取函数
+    df = read_excel_file(input_path, log)
+    
+    # 检查必要的列是否存在
+    required_columns = ['X', 'Y']
+    if not all(col in df.columns for col in required_columns):
+        missing_cols = [col for col in required_columns if col not in df.columns]
+        raise ConversionInputError(f"Excel文件缺少必要的列: {missing_cols}")
+        
+    log(f"成功读取数据，共{len(df)}行")
+    
+    # 检查数据有效性
+    if df.empty:
+        raise ConversionInputError("Excel文件为空或没有有效数据")
+        
+    # 创建坐标转换器
+    log(f"源坐标系: {source_crs}")
+    log(f"目标坐标系: {target_crs}")
+    
+    transformer = Transformer.from_crs(source_crs_def, target_crs_def, always_xy=True)
+    
+    # 执行坐标转换
+    log("正在进行坐标转换...")
+    
+    # 确保X和Y列是数值类型
+    df['X'] = pd.to_numeric(df['X'], errors='coerce')
+    df['Y'] = pd.to_numeric(df['Y'], errors='coerce')
+    
+    # 检查是否有无效数据
+    invalid_rows = df[df['X'].isna() | df['Y'].isna()]
+    if not invalid_rows.empty:
+        log(f"警告: 发现{len(invalid_rows)}行无效数据，将被忽略")
+        df = df.dropna(subset=['X', 'Y'])
+        if df.empty:
+            raise ConversionInputError("所有数据都是无效的，请检查输入文件")
+    
+    # 记录原始列名（除了X和Y）
+    original_columns = [col for col in df.columns if col not in ['X', 'Y']]
+    
+    # 执行坐标转换
+    x_new, y_new = transformer.transform(df['X'].values, df['Y'].values)
+    
+    # 创建新的DataFrame，只保留原始列（除了X和Y）以及新的X_new和Y_new列
+    new_df = df[original_columns].copy()
+    new_df['X_new'] = x_new
+    new_df['Y_new'] = y_new
+    
+    # 确保输出目录存在
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        
+    # 写入Excel文件
+    log("正在保存结果...")
+    new_df.to_excel(output_path, index=False, engine='openpyxl')
+    
+    log(f"转换完成！结果已保存到: {output_path}")
+    log("注意：原X和Y列已被删除，只保留了X_new和Y_new列")
+    return new_df
+
+
 class CoordinateConverterApp:
     def __init__(self, root):
         self.root = root
@@ -19,11 +166,8 @@ class CoordinateConverterApp:
         self.target_crs = tk.StringVar()
         
         # CGCS2000经度带选项
-        self.cgcs2000_zones = [
-            "CGCS2000 108°E", "CGCS2000 111°E", "CGCS2000 114°E", 
-            "CGCS2000 117°E", "CGCS2000 120°E", "CGCS2000 123°E"
-        ]
-        self.all_crs_options = self.cgcs2000_zones + ["WGS1984"]
+        self.cgcs2000_zones = CGCS2000_ZONES
+        self.all_crs_options = ALL_CRS_OPTIONS
         
         # 创建界面
         self.create_widgets()
@@ -121,58 +265,15 @@ class CoordinateConverterApp:
         
     def get_cgcs2000_crs_string(self, zone_name):
         """根据经度带名称生成CGCS2000 CRS字符串"""
-        # 提取经度值
-        lon_value = int(zone_name.split(" ")[1].replace("°E", ""))
-        
-        # CGCS2000 3度带投影参数
-        crs_string = (
-            f"+proj=tmerc +lat_0=0 +lon_0={lon_value} "
-            f"+k=1 +x_0=500000 +y_0=0 "
-            f"+ellps=GRS80 +units=m +no_defs"
-        )
-        return crs_string
+        return get_cgcs2000_crs_string(zone_name)
         
     def get_crs_definition(self, crs_name):
         """获取坐标系定义"""
-        if crs_name == "WGS1984":
-            return "EPSG:4326"
-        elif crs_name.startswith("CGCS2000"):
-            return self.get_cgcs2000_crs_string(crs_name)
-        else:
-            return None
+        return get_crs_definition(crs_name)
             
     def read_excel_file(self, file_path):
         """增强的Excel文件读取函数，支持多种格式和错误处理"""
-        try:
-            # 首先尝试使用openpyxl引擎读取.xlsx文件
-            if file_path.endswith('.xlsx'):
-                try:
-                    df = pd.read_excel(file_path, engine='openpyxl')
-                    return df
-                except Exception as e:
-                    self.log_message(f"使用openpyxl读取失败: {str(e)}")
-                    # 如果openpyxl失败，尝试使用xlrd引擎
-                    try:
-                        df = pd.read_excel(file_path, engine='xlrd')
-                        return df
-                    except Exception as e2:
-                        self.log_message(f"使用xlrd读取失败: {str(e2)}")
-                        raise e2
-            # 对于.xls文件，使用xlrd引擎
-            elif file_path.endswith('.xls'):
-                df = pd.read_excel(file_path, engine='xlrd')
-                return df
-            else:
-                # 尝试自动检测
-                try:
-                    df = pd.read_excel(file_path, engine='openpyxl')
-                    return df
-                except:
-                    df = pd.read_excel(file_path, engine='xlrd')
-                    return df
-        except Exception as e:
-            self.log_message(f"读取Excel文件时出错: {str(e)}")
-            raise e
+        return read_excel_file(file_path, self.log_message)
             
     def convert_coordinates(self):
         # 检查输入
@@ -192,83 +293,14 @@ class CoordinateConverterApp:
             messagebox.showerror("错误", "请设置输出文件路径")
             return
             
-        # 获取坐标系定义
-        source_crs_def = self.get_crs_definition(self.source_crs.get())
-        target_crs_def = self.get_crs_definition(self.target_crs.get())
-        
-        if not source_crs_def or not target_crs_def:
-            messagebox.showerror("错误", "无法识别的坐标系统")
-            return
-            
         try:
-            self.log_message("开始读取Excel文件...")
-            
-            # 读取Excel文件，使用增强的读取函数
-            df = self.read_excel_file(self.input_file_path.get())
-            
-            # 检查必要的列是否存在
-            required_columns = ['X', 'Y']
-            if not all(col in df.columns for col in required_columns):
-                missing_cols = [col for col in required_columns if col not in df.columns]
-                messagebox.showerror("错误", f"Excel文件缺少必要的列: {missing_cols}")
-                return
-                
-            self.log_message(f"成功读取数据，共{len(df)}行")
-            
-            # 检查数据有效性
-            if df.empty:
-                messagebox.showerror("错误", "Excel文件为空或没有有效数据")
-                return
-                
-            # 创建坐标转换器
-            self.log_message(f"源坐标系: {self.source_crs.get()}")
-            self.log_message(f"目标坐标系: {self.target_crs.get()}")
-            
-            transformer = Transformer.from_crs(source_crs_def, target_crs_def, always_xy=True)
-            
-            # 执行坐标转换
-            self.log_message("正在进行坐标转换...")
-            
-            # 确保X和Y列是数值类型
-            df['X'] = pd.to_numeric(df['X'], errors='coerce')
-            df['Y'] = pd.to_numeric(df['Y'], errors='coerce')
-            
-            # 检查是否有无效数据
-            invalid_rows = df[df['X'].isna() | df['Y'].isna()]
-            if not invalid_rows.empty:
-                self.log_message(f"警告: 发现{len(invalid_rows)}行无效数据，将被忽略")
-                df = df.dropna(subset=['X', 'Y'])
-                if df.empty:
-                    messagebox.showerror("错误", "所有数据都是无效的，请检查输入文件")
-                    return
-            
-            # 记录原始列名（除了X和Y）
-            original_columns = [col for col in df.columns if col not in ['X', 'Y']]
-            
-            # 执行坐标转换
-            x_new, y_new = transformer.transform(df['X'].values, df['Y'].values)
-            
-            # 创建新的DataFrame，只保留原始列（除了X和Y）以及新的X_new和Y_new列
-            new_df = df[original_columns].copy()
-            new_df['X_new'] = x_new
-            new_df['Y_new'] = y_new
-            
-            # 保存结果
             output_path = self.output_file_path.get()
-            
-            # 确保输出目录存在
-            output_dir = os.path.dirname(output_path)
-            if output_dir and not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-                
-            # 写入Excel文件
-            self.log_message("正在保存结果...")
-            new_df.to_excel(output_path, index=False, engine='openpyxl')
-            
-            self.log_message(f"转换完成！结果已保存到: {output_path}")
-            self.log_message("注意：原X和Y列已被删除，只保留了X_new和Y_new列")
+            convert_coordinate_file(self.input_file_path.get(), output_path, self.source_crs.get(),
+                                    self.target_crs.get(), self.log_message)
             messagebox.showinfo("成功", f"坐标转换完成！\n结果已保存到: {output_path}\n注意：原X和Y列已被删除，只保留了X_new和Y_new列")
             
+        except ConversionInputError as e:
+            messagebox.showerror("错误", str(e))
         except Exception as e:
             error_msg = f"转换过程中发生错误: {str(e)}"
             self.log_message(error_msg)
@@ -0,0 +1,81 @@
+import queue
+import sys
+import threading
+
+
+class _ThreadStdout:
+    """按线程分流的stdout：任务线程中的print输出进入事件队列，其他线程照常输出"""
+
+    def __init__(self, original, thread, events):
+        self.original = original
+        self.thread = thread
+        self.events = events
+
+    def write(self, text):
+        if threading.current_thread() is self.thread:
+            if text:
+                self.events.put(('log', text))
+        elif self.original is not None:
+            self.original.write(text)
+
+    def flush(self):
+        if self.original is not None:
+            self.original.flush()
+
+
+class JobRunner:
+    """在后台线程中执行耗时任务，日志和进度事件通过队列传回界面线程
+
+    队列中的事件为 (类型, 内容) 元组，类型包括：
+    'log'（print输出的文本）、'progress'（任务的进度事件字典）、
+    'done'（任务返回值）、'cancelled'、'error'（错误信息）。
+    界面线程应定时调用 poll() 取出事件，不能在后台线程中直接操作Tk控件。
+    """
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self._thread = None
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, func, *args, **kwargs):
+        """在后台线程中执行 func，并向其传入 progress 和 cancel_event 关键字参数"""
+        if self.running():
+            raise RuntimeError("已有任务正在执行")
+        self.cancel_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(func, args, kwargs), daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """请求取消任务，任务在下一个检查点停止"""
+        self.cancel_event.set()
+
+    def poll(self):
+        """取出当前队列中的全部事件"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _progress(self, event):
+        self.events.put(('progress', event))
+
+    def _run(self, func, args, kwargs):
+        original_stdout = sys.stdout
+        proxy = _ThreadStdout(original_stdout, threading.current_thread(), self.events)
+        sys.stdout = proxy
+        try:
+            result = func(*args, progress=self._progress, cancel_event=self.cancel_event, **kwargs)
+            self.events.put(('done', result))
+        except Exception as e:
+            if self.cancel_event.is_set():
+                self.events.put(('cancelled', str(e)))
+            else:
+                self.events.put(('error', str(e)))
+        finally:
+            if sys.stdout is proxy:
+                sys.stdout = original_stdout
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import CRS
+from shapely import STRtree
+
+from ShpEncoding import resolve_shp_encoding
+
+
+# 裁剪几何缓存的默认位置和容量上限
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.JXFloodRiskMapping', 'clip_cache')
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# 参与计算缓存键的Shapefile组成文件
+_MESH_SIDECARS = ('.shp', '.shx', '.dbf', '.prj')
+
+
+class MeshClipper:
+    """网格化区间擦除引擎
+
+    裁剪区域在创建时只合并一次，并拆分为互不重叠的多边形建立STRtree空间索引。
+    擦除时先用索引筛选出与裁剪区域相交的单元，再区分完全位于区域内的单元
+    （直接删除）和跨越边界的单元，只对后者执行代价较高的差集运算。
+    """
+
+    def __init__(self, clip_gdf):
+        self.crs = clip_gdf.crs
+        self._build(shapely.union_all(clip_gdf.geometry.values))
+
+    @classmethod
+    def from_wkb(cls, wkb, crs):
+        """由已合并裁剪几何的WKB重建裁剪引擎"""
+        clipper = cls.__new__(cls)
+        clipper.crs = crs
+        clipper._build(shapely.from_wkb(wkb))
+        return clipper
+
+    def _build(self, union):
+        self.union = union
+        # 合并后的各部分互不重叠，逐部分做差集与整体做差集结果一致
+        self.parts = shapely.get_parts(union)
+        shapely.prepare(self.union)
+        self.tree = STRtree(self.parts)
+
+    def __getstate__(self):
+        # STRtree和预处理几何无法序列化，传给工作进程时只传递WKB，到达后重建
+        return {'crs': self.crs, 'union': self.to_wkb()}
+
+    def __setstate__(self, state):
+        self.crs = state['crs']
+        self._build(shapely.from_wkb(state['union']))
+
+    def to_wkb(self):
+        return shapely.to_wkb(self.union)
+
+    def erase(self, gdf):
+        """从gdf中擦除与裁剪区域重叠的部分
+
+        返回擦除后的GeoDataFrame（已过滤空几何），以及区域外、区域内、
+        边界单元的数量。
+        """
+        # 确保坐标系一致
+        if gdf.crs != self.crs:
+            gdf = gdf.to_crs(self.crs)
+
+        geoms = np.asarray(gdf.geometry.values)
+        element_idx, part_idx = self.tree.query(geoms, predicate='intersects')
+
+        # 与裁剪区域相交的单元中，被完全覆盖的直接删除，其余为边界单元
+        hit = np.unique(element_idx)
+        inside = hit[shapely.covers(self.union, geoms[hit])]
+        boundary_mask = ~np.isin(element_idx, inside)
+        element_idx = element_idx[boundary_mask]
+        part_idx = part_idx[boundary_mask]
+
+        result = geoms.copy()
+        if len(element_idx):
+            # 一个单元可能与多个部分相交，按相交顺序分轮次依次做差集
+            order = np.argsort(element_idx, kind='stable')
+            element_idx = element_idx[order]
+            part_idx = part_idx[order]
+            rank = np.arange(len(element_idx)) - np.searchsorted(element_idx, element_idx)
+            for r in range(rank.max() + 1):
+                selected = rank == r
+                targets = element_idx[selected]
+                result[targets] = shapely.difference(result[targets], self.parts[part_idx[selected]])
+
+        keep = np.ones(len(geoms), dtype=bool)
+        keep[inside] = False
+        keep &= ~shapely.is_empty(result)
+
+        gdf = gdf[keep].copy()
+        gdf[gdf.geometry.name] = result[keep]
+
+        n_boundary = len(hit) - len(inside)
+        counts = (len(geoms) - len(hit), len(inside), n_boundary)
+        return gdf, counts
+
+
+def mesh_cache_key(mesh_shp_file, target_crs):
+    """缓存键：网格化区间各组成文件的内容哈希加目标坐标系"""
+    digest = hashlib.sha1()
+    base = os.path.splitext(mesh_shp_file)[0]
+    for ext in _MESH_SIDECARS:
+        path = base + ext
+        if not os.path.exists(path):
+            continue
+        digest.update(ext.encode('ascii'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    crs_text = CRS.from_user_input(target_crs).to_wkt() if target_crs is not None else 'native'
+    digest.update(crs_text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _evict_cache(cache_dir, max_bytes):
+    """缓存总大小超过上限时，按最近使用时间从旧到新删除缓存项"""
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.wkb'):
+            continue
+        path = os.path.join(cache_dir, name)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, path, stat.st_size))
+        total += stat.st_size
+
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        for cache_file in (path, path[:-len('.wkb')] + '.json'):
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+        total -= size
+
+
+def load_mesh_clipper(mesh_shp_file, target_crs=None, use_cache=True, cache_dir=None,
+                      max_cache_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """加载网格化区间并建立裁剪引擎，优先使用磁盘缓存
+
+    缓存以网格化区间文件内容和目标坐标系为键，保存合并（及重投影）后的裁剪
+    几何的WKB，网格化区间文件被修改后自动失效；空间索引由缓存的几何快速重建。
+    返回 (裁剪引擎, 是否命中缓存)。
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+
+    if use_cache:
+        key = mesh_cache_key(mesh_shp_file, target_crs)
+        wkb_path = os.path.join(cache_dir, key + '.wkb')
+        meta_path = os.path.join(cache_dir, key + '.json')
+        if os.path.exists(wkb_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                with open(wkb_path, 'rb') as f:
+                    wkb = f.read()
+                # 更新修改时间，供按最近使用时间淘汰
+                os.utime(wkb_path)
+                crs = CRS.from_wkt(meta['crs']) if meta.get('crs') else None
+                return MeshClipper.from_wkb(wkb, crs), True
+            except Exception as e:
+                print(f"读取裁剪缓存失败，将重新生成：{str(e)}")
+
+    clip_gdf = gpd.read_file(mesh_shp_file, encoding=resolve_shp_encoding(mesh_shp_file))
+    if target_crs is not None and clip_gdf.crs is not None:
+        clip_gdf = clip_gdf.to_crs(target_crs)
+    clipper = MeshClipper(clip_gdf)
+
+    if use_cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(wkb_path, 'wb') as f:
+                f.write(clipper.to_wkb())
+            meta = {
+                'source': os.path.abspath(mesh_shp_file),
+                'crs': clipper.crs.to_wkt() if clipper.crs is not None else None,
+            }
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            _evict_cache(cache_dir, max_cache_bytes)
+        except OSError as e:
+            print(f"写入裁剪缓存失败：{str(e)}")
+
+    return clipper, False
+
+
+def clear_clip_cache(cache_dir=None):
+    """清除裁剪几何缓存，返回删除的缓存项数量"""
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith('.wkb') or name.endswith('.json'):
+            os.remove(os.path.join(cache_dir, name))
+            removed += name.endswith('.wkb')
+    return removed
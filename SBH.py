@@ -4,6 +4,8 @@ import pandas as pd
 from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 
+from ShpEncoding import resolve_shp_encoding
+
 def extract_shp_to_excel(main_folder, output_file):
     # 创建Excel写入对象
     writer = pd.ExcelWriter(output_file, engine='openpyxl')
@@ -26,7 +28,7 @@ def extract_shp_to_excel(main_folder, output_file):
             
         try:
             # 读取shp文件并转换为DataFrame
-            gdf = gpd.read_file(shp_path)
+            gdf = gpd.read_file(shp_path, encoding=resolve_shp_encoding(shp_path))
             
             # 移除几何列（如果需要保留可以注释这行）
             df = pd.DataFrame(gdf.drop(columns='geometry'))
@@ -0,0 +1,133 @@
+import codecs
+import os
+import struct
+
+
+# DBF文件头第29字节（语言驱动ID）与编码的对应关系
+LDID_ENCODINGS = {
+    0x01: 'cp437',
+    0x02: 'cp850',
+    0x03: 'cp1252',
+    0x4D: 'gbk',
+    0x4E: 'cp949',
+    0x4F: 'cp950',
+    0x50: 'cp874',
+    0x7A: 'gbk',
+    0xC8: 'cp1250',
+    0xC9: 'cp1251',
+}
+
+# .cpg 文件中常见的代码页写法
+CPG_ALIASES = {
+    '65001': 'utf-8',
+    '936': 'gbk',
+    'cp936': 'gbk',
+    'ansi 936': 'gbk',
+    '1252': 'cp1252',
+    'ansi 1252': 'cp1252',
+}
+
+# 从记录样本中检测编码时依次尝试的编码，都失败时使用 latin-1
+SAMPLE_ENCODINGS = ['utf-8', 'gbk']
+FALLBACK_ENCODING = 'latin-1'
+
+# 抽样检测的记录数
+SAMPLE_RECORDS = 500
+
+# 已解析的编码缓存，键为 (dbf路径, 修改时间, 文件大小)
+_encoding_cache = {}
+
+
+def _normalize_encoding(name):
+    """将 .cpg 等处写法各异的编码名称规范化，无法识别时返回None"""
+    name = name.strip().strip('\x00').strip()
+    if not name:
+        return None
+    alias = CPG_ALIASES.get(name.lower())
+    if alias:
+        return alias
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def _read_cpg(shp_path):
+    """读取 .cpg 文件中声明的编码"""
+    cpg_path = os.path.splitext(shp_path)[0] + '.cpg'
+    if not os.path.exists(cpg_path):
+        return None
+    with open(cpg_path, 'rb') as f:
+        return _normalize_encoding(f.read(64).decode('ascii', errors='ignore'))
+
+
+def _read_dbf_sample(dbf_path):
+    """读取DBF文件头中的语言驱动ID，以及前若干条记录中字符型字段的原始字节"""
+    with open(dbf_path, 'rb') as f:
+        header = f.read(32)
+        if len(header) < 32:
+            return None, b''
+        num_records, header_length, record_length = struct.unpack('<IHH', header[4:12])
+        ldid = header[29]
+
+        # 解析字段描述，记录字符型字段在记录中的位置
+        descriptors = f.read(header_length - 32)
+        char_fields = []
+        offset = 1  # 每条记录的第一个字节是删除标记
+        for i in range(0, len(descriptors) - 31, 32):
+            descriptor = descriptors[i:i + 32]
+            if descriptor[0] == 0x0D:
+                break
+            field_type = chr(descriptor[11])
+            field_length = descriptor[16]
+            if field_type == 'C':
+                char_fields.append((offset, field_length))
+            offset += field_length
+
+        if not char_fields:
+            return ldid, b''
+
+        f.seek(header_length)
+        data = f.read(record_length * min(num_records, SAMPLE_RECORDS))
+
+    sample = bytearray()
+    for start in range(0, len(data) - record_length + 1, record_length):
+        for field_offset, field_length in char_fields:
+            sample += data[start + field_offset:start + field_offset + field_length].rstrip(b' \x00')
+            sample += b' '
+    return ldid, bytes(sample)
+
+
+def _decodes(sample, encoding):
+    try:
+        sample.decode(encoding)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def resolve_shp_encoding(shp_path):
+    """确定Shapefile属性表的编码，只读取 .cpg 文件、DBF文件头和少量记录
+
+    依次参考 .cpg 声明、DBF语言驱动ID和记录样本，声明的编码无法解码样本时
+    继续向后判断。结果按文件缓存，同一文件不会重复检测。
+    """
+    dbf_path = os.path.splitext(shp_path)[0] + '.dbf'
+    if not os.path.exists(dbf_path):
+        return _read_cpg(shp_path) or SAMPLE_ENCODINGS[0]
+
+    stat = os.stat(dbf_path)
+    cache_key = (os.path.abspath(dbf_path), stat.st_mtime_ns, stat.st_size)
+    if cache_key in _encoding_cache:
+        return _encoding_cache[cache_key]
+
+    ldid, sample = _read_dbf_sample(dbf_path)
+    candidates = [_read_cpg(shp_path), LDID_ENCODINGS.get(ldid)] + SAMPLE_ENCODINGS
+    encoding = FALLBACK_ENCODING
+    for candidate in candidates:
+        if candidate and _decodes(sample, candidate):
+            encoding = candidate
+            break
+
+    _encoding_cache[cache_key] = encoding
+    return encoding
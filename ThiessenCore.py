@@ -0,0 +1,241 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import MultiPoint
+from shapely.ops import voronoi_diagram
+
+from ShpEncoding import resolve_shp_encoding
+
+
+# 叠加时记录面要素序号的临时列
+_POLYGON_INDEX = '_polygon_index'
+
+# 并行处理时每个进程分到的面要素组数
+SHARDS_PER_WORKER = 4
+
+# 工作进程中的泰森多边形及其空间索引，由进程池初始化函数设置
+_worker_voronoi = None
+_worker_tree = None
+
+# shapely几何类型编号
+POLYGON_TYPE_ID = 3
+MULTIPOLYGON_TYPE_ID = 6
+
+
+def build_station_voronoi(rain_gauges, crs):
+    """用全部雨量站生成一次泰森多边形，并附加雨量站的属性字段"""
+    points = MultiPoint(rain_gauges.geometry)
+    voronoi_polygons = voronoi_diagram(points)
+
+    # 将泰森多边形转换为GeoDataFrame，并保留雨量站的属性
+    voronoi_gdf = gpd.GeoDataFrame(geometry=[poly for poly in voronoi_polygons.geoms], crs=crs)
+    return voronoi_gdf.sjoin(rain_gauges, how="inner")  # 保留雨量站的属性字段
+
+
+def intersect_polygons(voronoi_gdf, polygons):
+    """将泰森多边形与全部面要素做一次带空间索引的相交叠加
+
+    返回 {面要素位置: 相交部分}，各面要素的相交部分按泰森多边形顺序排列，列与逐个面要素
+    叠加的结果相同，并已添加面积列 area_km2（平方千米）。没有相交部分的面要素不在字典中。
+    """
+    indexed = polygons.copy()
+    indexed[_POLYGON_INDEX] = range(len(polygons))
+    intersected = gpd.overlay(voronoi_gdf, indexed, how='intersection')
+    intersected['area_km2'] = intersected.geometry.area / 1e6  # 面积单位：平方千米
+
+    pieces = {}
+    for position, group in intersected.groupby(_POLYGON_INDEX, sort=False):
+        pieces[position] = group.drop(columns=_POLYGON_INDEX).reset_index(drop=True)
+    return pieces, intersected.drop(columns=_POLYGON_INDEX).iloc[:0]
+
+
+def _area_table(valid, polygon_names, shape_names):
+    """各相交部分的面积表，列顺序与逐行追加时相同（ID列在最后，没有相交部分时不含ID列）"""
+    if len(valid) == 0:
+        return pd.DataFrame(columns=["Polygon_Name", "Shape_Name", "Area_km2"])
+    return pd.DataFrame({
+        "Polygon_Name": polygon_names,
+        "Shape_Name": shape_names,
+        "Area_km2": valid['area_km2'].to_numpy(),
+        "ID": valid['ID'].to_numpy() if 'ID' in valid.columns else None,  # 添加ID列
+    })
+
+
+def region_coordinates(geometries):
+    """批量取出各面的外环顶点坐标（多部件面逐个部件）
+
+    返回 (所属要素序号, 节点个数, 坐标字符串)，坐标字符串为 "X1,Y1,X2,Y2,..." 的形式，
+    节点个数包含与第一个点重复的最后一个点。不是面或多部件面的几何不输出。
+    """
+    geometries = np.asarray(geometries)
+    is_polygon = np.isin(shapely.get_type_id(geometries), [POLYGON_TYPE_ID, MULTIPOLYGON_TYPE_ID])
+    parts, owners = shapely.get_parts(geometries[is_polygon], return_index=True)
+    owners = np.flatnonzero(is_polygon)[owners]
+
+    rings = shapely.get_exterior_ring(parts)
+    num_vertices = shapely.get_num_coordinates(rings)
+    # 所有顶点一次转为文字，再按各外环的顶点范围拼接
+    values = list(map(repr, shapely.get_coordinates(rings).ravel().tolist()))
+    ends = np.cumsum(num_vertices) * 2
+    starts = ends - num_vertices * 2
+    coord_strs = [",".join(values[start:end]) for start, end in zip(starts.tolist(), ends.tolist())]
+    return owners, num_vertices, coord_strs
+
+
+def _coordinates_table(valid, polygon_names, name_field):
+    """泰森多边形信息表：每个外环一行，合并REGION和坐标信息"""
+    columns = ["Polygon_Name", "Station_Name", "Station_ID", "Region_and_Coordinates"]
+    owners, num_vertices, coord_strs = region_coordinates(valid.geometry.values)
+    if len(owners) == 0:
+        return pd.DataFrame(columns=columns)
+
+    regions = [f"REGION={n}" for n in num_vertices.tolist()]
+    station_names = valid[name_field].to_numpy()[owners] if name_field in valid.columns else 'Unknown'
+    station_ids = valid['ID'].to_numpy()[owners] if 'ID' in valid.columns else 'Unknown'
+    return pd.DataFrame({
+        "Polygon_Name": np.asarray(polygon_names, dtype=object)[owners],
+        "Station_Name": station_names,
+        "Station_ID": station_ids,
+        "Region_and_Coordinates": [f"{region},{coord_str}" for region, coord_str in zip(regions, coord_strs)],
+        "Region": regions,
+        "Vertex_Coordinates": coord_strs,
+    })
+
+
+def _write_polygon_outputs(polygons, pieces, empty_pieces, output_folder, progress=None, total=None):
+    """逐个面要素输出 polygon_N.shp 和 polygon_N_intersected.shp
+
+    pieces 为 intersect_polygons 的结果（键为面要素在 polygons 中的位置）。
+    返回 (有效相交部分列表, 各部分的面要素名称, 各部分的输出文件名)。
+    """
+    total = total or len(polygons)
+    valid_frames = []
+    polygon_names = []
+    shape_names = []
+
+    # 遍历面文件中的每个shape
+    for position, (idx, polygon) in enumerate(polygons.iterrows()):
+        if progress is not None:
+            progress(f"正在处理多边形 {idx + 1}/{total}")
+
+        polygon_name = f"polygon_{idx + 1}"
+
+        # 导出当前shape为单独的Shapefile
+        single_polygon_gdf = gpd.GeoDataFrame([polygon], columns=polygons.columns, crs=polygons.crs)
+
+        single_polygon_path = os.path.join(output_folder, f"{polygon_name}.shp")
+        single_polygon_gdf.to_file(single_polygon_path, encoding='utf-8')
+
+        # 当前shape与泰森多边形的相交部分，筛选有效多边形
+        intersected_polygons = pieces.get(position, empty_pieces)
+        valid_polygons = intersected_polygons[intersected_polygons['area_km2'] > 0]
+
+        # 输出相交后的Shapefile
+        output_shp_name = f"{polygon_name}_intersected.shp"
+        output_shp_path = os.path.join(output_folder, output_shp_name)
+        valid_polygons.to_file(output_shp_path, encoding='utf-8')
+
+        valid_frames.append(valid_polygons)
+        polygon_names.extend([polygon_name] * len(valid_polygons))
+        shape_names.extend([output_shp_name] * len(valid_polygons))
+
+    return valid_frames, polygon_names, shape_names
+
+
+def _init_thiessen_worker(voronoi_gdf):
+    """泰森多边形进程池初始化函数：每个工作进程只接收一次泰森多边形并建立STRtree"""
+    global _worker_voronoi, _worker_tree
+    _worker_voronoi = voronoi_gdf
+    _worker_tree = shapely.STRtree(voronoi_gdf.geometry.values)
+
+
+def _process_shard_in_worker(polygons, output_folder):
+    """处理一组面要素：只与STRtree筛选出的候选泰森多边形叠加，并输出各面要素的Shapefile"""
+    candidates = np.unique(_worker_tree.query(polygons.geometry.values, predicate='intersects')[1])
+    pieces, empty_pieces = intersect_polygons(_worker_voronoi.iloc[candidates], polygons)
+    return _write_polygon_outputs(polygons, pieces, empty_pieces, output_folder)
+
+
+def _shard_bounds(n_polygons, max_workers):
+    """将面要素按顺序分为连续的若干组，组数为进程数的若干倍以均衡负载"""
+    n_shards = min(n_polygons, max_workers * SHARDS_PER_WORKER)
+    edges = np.linspace(0, n_polygons, n_shards + 1).astype(int)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def _process_polygons_parallel(voronoi_gdf, polygons, output_folder, max_workers, progress=None):
+    """在进程池中分组处理面要素，结果按面要素顺序合并，与串行处理的输出相同"""
+    shards = _shard_bounds(len(polygons), max_workers)
+    valid_frames, polygon_names, shape_names = [], [], []
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_thiessen_worker,
+                             initargs=(voronoi_gdf,)) as executor:
+        futures = [executor.submit(_process_shard_in_worker, polygons.iloc[start:end], output_folder)
+                   for start, end in shards]
+        # 按提交顺序取回结果，合并顺序与完成顺序无关
+        for (start, end), future in zip(shards, futures):
+            frames, names, shapes = future.result()
+            valid_frames.extend(frames)
+            polygon_names.extend(names)
+            shape_names.extend(shapes)
+            done += end - start
+            if progress is not None:
+                progress(f"已处理多边形 {done}/{len(polygons)}")
+    return valid_frames, polygon_names, shape_names
+
+
+def generate_thiessen_polygons(polygon_shp_path, rain_gauge_shp_path, output_folder, name_field=None, progress=None,
+                               max_workers=1):
+    """生成各面要素内的泰森多边形，并将相交结果和面积表输出到 output_folder
+
+    name_field 不为空时同时输出泰森多边形信息表（站点名称取该字段）。
+    progress 为接收进度文字的回调，不依赖图形界面，可在命令行或基准测试中直接调用。
+    泰森多边形和雨量站属性只生成一次。max_workers 为1时与全部面要素的相交在一次叠加中完成；
+    大于1时面要素按顺序分组在进程池中并行处理，各进程只与空间索引筛选出的候选泰森多边形相交，
+    输出与串行处理相同。返回 (面积结果表, 信息表或None)。
+    """
+    # 读取数据
+    polygons = gpd.read_file(polygon_shp_path, encoding=resolve_shp_encoding(polygon_shp_path))
+    rain_gauges = gpd.read_file(rain_gauge_shp_path, encoding=resolve_shp_encoding(rain_gauge_shp_path))
+
+    # 检查坐标系统
+    if polygons.crs != rain_gauges.crs:
+        rain_gauges = rain_gauges.to_crs(polygons.crs)
+
+    # 创建输出文件夹
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    # 使用全部雨量站生成一次泰森多边形，再与面要素相交
+    if progress is not None:
+        progress("正在生成泰森多边形并与面要素相交")
+    voronoi_gdf = build_station_voronoi(rain_gauges, polygons.crs)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(polygons))
+    if max_workers > 1:
+        valid_frames, polygon_names, shape_names = _process_polygons_parallel(
+            voronoi_gdf, polygons, output_folder, max_workers, progress)
+        valid = pd.concat(valid_frames, ignore_index=True)
+    else:
+        pieces, empty_pieces = intersect_polygons(voronoi_gdf, polygons)
+        valid_frames, polygon_names, shape_names = _write_polygon_outputs(
+            polygons, pieces, empty_pieces, output_folder, progress)
+        valid = pd.concat(valid_frames, ignore_index=True) if valid_frames else empty_pieces
+
+    # 相交部分收集后一次生成结果表
+    results = _area_table(valid, polygon_names, shape_names)
+    coordinates_results = _coordinates_table(valid, polygon_names, name_field) if name_field else None
+
+    # 输出结果到Excel
+    results_path = os.path.join(output_folder, "results.xlsx")
+    results.to_excel(results_path, index=False)
+
+    # 如果需要输出坐标信息，也保存到Excel
+    if name_field and coordinates_results is not None:
+        coordinates_path = os.path.join(output_folder, "coordinates_results.xlsx")
+        coordinates_results.to_excel(coordinates_path, index=False)
+
+    return results, coordinates_results
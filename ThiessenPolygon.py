@@ -1,11 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import geopandas as gpd
-import pandas as pd
-from shapely.geometry import MultiPoint
-from shapely.ops import voronoi_diagram
+import multiprocessing
 import os
 
+from ShpEncoding import resolve_shp_encoding
+from ThiessenCore import generate_thiessen_polygons
+
+
 class ThiessenPolygonApp:
     def __init__(self, root):
         self.root = root
@@ -17,6 +19,7 @@ class ThiessenPolygonApp:
         self.rain_gauge_shp_path = ""
         self.rain_gauges = None
         self.output_folder = ""
+        self.max_workers = tk.IntVar(value=1)
         
         # 创建界面
         self.create_widgets()
@@ -66,6 +69,15 @@ class ThiessenPolygonApp:
         self.field_combo = ttk.Combobox(self.name_field_frame, state="readonly", width=30)
         self.field_combo.grid(row=0, column=1, padx=(10, 0))
         
+        # 并行进程数（子流域较多时按组分配到多个进程处理）
+        workers_frame = ttk.Frame(step3_frame)
+        workers_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        ttk.Label(workers_frame, text="并行进程数:").grid(row=0, column=0, sticky=tk.W)
+        
+        workers_spinbox = ttk.Spinbox(workers_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.max_workers, width=10)
+        workers_spinbox.grid(row=0, column=1, padx=(10, 0))
+        
         # 第四步：输出路径
         step4_frame = ttk.LabelFrame(main_frame, text="第四步：选择输出路径", padding="10")
         step4_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
@@ -106,7 +118,7 @@ class ThiessenPolygonApp:
         )
         if file_path:
             try:
-                self.rain_gauges = gpd.read_file(file_path)
+                self.rain_gauges = gpd.read_file(file_path, encoding=resolve_shp_encoding(file_path))
                 self.rain_gauge_shp_path = file_path
                 self.rain_gauge_label.config(text=os.path.basename(file_path))
                 
@@ -168,118 +180,10 @@ class ThiessenPolygonApp:
             self.progress_var.set("正在处理...")
             self.root.update()
             
-            # 读取数据
-            polygons = gpd.read_file(self.polygon_shp_path)
-            rain_gauges = gpd.read_file(self.rain_gauge_shp_path)
-            
-            # 检查坐标系统
-            if polygons.crs != rain_gauges.crs:
-                rain_gauges = rain_gauges.to_crs(polygons.crs)
-            
-            # 创建输出文件夹
-            if not os.path.exists(self.output_folder):
-                os.makedirs(self.output_folder)
-            
-            # 初始化结果DataFrame
-            results = pd.DataFrame(columns=["Polygon_Name", "Shape_Name", "Area_km2"])
-            
-            # 初始化坐标结果DataFrame（如果需要输出）
-            coordinates_results = None
-            if self.output_option_var.get():
-                coordinates_results = pd.DataFrame(columns=["Polygon_Name", "Station_Name", "Station_ID", "Region_and_Coordinates"])
-            
-            # 遍历面文件中的每个shape
-            for idx, polygon in polygons.iterrows():
-                self.progress_var.set(f"正在处理多边形 {idx + 1}/{len(polygons)}")
-                self.root.update()
-                
-                # 提取当前shape
-                current_polygon = polygon.geometry
-                polygon_name = f"polygon_{idx + 1}"
-                
-                # 导出当前shape为单独的Shapefile
-                single_polygon_gdf = gpd.GeoDataFrame([polygon], columns=polygons.columns, crs=polygons.crs)
-                # 删除可能的多余字段
-                
-                single_polygon_path = os.path.join(self.output_folder, f"{polygon_name}.shp")
-                single_polygon_gdf.to_file(single_polygon_path, encoding='utf-8')
-                
-                # 使用全部雨量站生成泰森多边形
-                points = MultiPoint(rain_gauges.geometry)
-                voronoi_polygons = voronoi_diagram(points)
-                
-                # 将泰森多边形转换为GeoDataFrame，并保留雨量站的属性
-                voronoi_gdf = gpd.GeoDataFrame(geometry=[poly for poly in voronoi_polygons.geoms], crs=polygons.crs)
-                voronoi_gdf = voronoi_gdf.sjoin(rain_gauges, how="inner")  # 保留雨量站的属性字段
-                
-                # 将泰森多边形与当前shape相交
-                intersected_polygons = gpd.overlay(voronoi_gdf, single_polygon_gdf, how='intersection')
-                
-                # 计算相交后的面积并筛选有效多边形
-                intersected_polygons['area_km2'] = intersected_polygons.geometry.area / 1e6  # 面积单位：平方千米
-                valid_polygons = intersected_polygons[intersected_polygons['area_km2'] > 0]
-                
-                # 输出相交后的Shapefile
-                output_shp_name = f"{polygon_name}_intersected.shp"
-                output_shp_path = os.path.join(self.output_folder, output_shp_name)
-                valid_polygons.to_file(output_shp_path, encoding='utf-8')
-                
-                # 将结果添加到结果表中
-                for _, row in valid_polygons.iterrows():
-                    new_row = pd.DataFrame({
-                        "Polygon_Name": [polygon_name],
-                        "Shape_Name": [output_shp_name],
-                        "ID": [row['ID']] if 'ID' in row else [None],  # 添加ID列
-                        "Area_km2": [row['area_km2']]
-                    })
-                    results = pd.concat([results, new_row], ignore_index=True)
-                    
-                    # 如果需要输出坐标信息
-                    if self.output_option_var.get():
-                        # 提取顶点坐标
-                        geometry = row.geometry
-                        vertex_coords = []
-                        
-                        if geometry.geom_type == 'Polygon':
-                            # 对于单个多边形，获取外边界坐标
-                            exterior_coords = list(geometry.exterior.coords)
-                            # 计算节点个数（减去重复的第一个点）
-                            num_vertices = len(exterior_coords)
-                            # 格式化为 "X1,Y1,X2,Y2,X3,Y3..." 的形式
-                            coord_str = ",".join([f"{x},{y}" for x, y in exterior_coords])  
-                            vertex_coords.append((num_vertices, coord_str))
-                        elif geometry.geom_type == 'MultiPolygon':
-                            # 对于多个多边形，分别处理每个部分
-                            for poly in geometry.geoms:
-                                exterior_coords = list(poly.exterior.coords)
-                                # 计算节点个数（减去重复的第一个点）
-                                num_vertices = len(exterior_coords)
-                                coord_str = ",".join([f"{x},{y}" for x, y in exterior_coords]) 
-                                vertex_coords.append((num_vertices, coord_str))
-                        
-                        # 添加到坐标结果表（合并REGION和坐标）
-                        for num_vertices, coord_str in vertex_coords:
-                            station_name = row.get(self.field_combo.get(), 'Unknown')
-                            # 合并REGION和坐标信息
-                            combined_info = f"REGION={num_vertices},{coord_str}"
-                            coord_row = pd.DataFrame({
-                                "Polygon_Name": [polygon_name],
-                                "Station_Name": [station_name],
-                                "Station_ID": [row.get('ID', 'Unknown')],
-                                "Region": [f"REGION={num_vertices}"],
-                                "Vertex_Coordinates": [coord_str],
-                                "Region_and_Coordinates": [combined_info]
-                            })
-                            coordinates_results = pd.concat([coordinates_results, coord_row], ignore_index=True)
-
-            # 输出结果到Excel
-            results_path = os.path.join(self.output_folder, "results.xlsx")
-            results.to_excel(results_path, index=False)
-            
-            # 如果需要输出坐标信息，也保存到Excel
-            if self.output_option_var.get() and coordinates_results is not None:
-                coordinates_path = os.path.join(self.output_folder, "coordinates_results.xlsx")
-                coordinates_results.to_excel(coordinates_path, index=False)
+            name_field = self.field_combo.get() if self.output_option_var.get() else None
+            generate_thiessen_polygons(self.polygon_shp_path, self.rain_gauge_shp_path, self.output_folder,
+                                       name_field, progress=self.update_progress,
+                                       max_workers=self.max_workers.get())
             
             self.progress_var.set("处理完成！")
             messagebox.showinfo("完成", f"泰森多边形生成完成！\n结果已保存到: {self.output_folder}")
@@ -287,8 +191,14 @@ class ThiessenPolygonApp:
         except Exception as e:
             self.progress_var.set("处理失败")
             messagebox.showerror("错误", f"处理过程中出现错误: {str(e)}")
+    
+    def update_progress(self, text):
+        self.progress_var.set(text)
+        self.root.update()
 
 if __name__ == "__main__":
+    # 打包为exe后，进程池的子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ThiessenPolygonApp(root)
     root.mainloop()
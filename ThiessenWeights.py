@@ -0,0 +1,368 @@
+import hashlib
+import itertools
+import os
+from collections import OrderedDict
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from ShpEncoding import resolve_shp_encoding
+from ThiessenCore import build_station_voronoi, intersect_polygons
+
+
+# 面积权重缓存的默认位置
+DEFAULT_WEIGHTS_DIR = os.path.join(os.path.expanduser('~'), '.JXFloodRiskMapping', 'thiessen_weights')
+
+# 权重计算方式改变时递增以使旧缓存失效
+WEIGHTS_VERSION = 1
+
+# 参与计算缓存键的Shapefile组成文件
+_SHP_SIDECARS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+# 动态权重LRU缓存的默认容量（雨量站有无数据的组合数）
+DEFAULT_MASK_CACHE_SIZE = 512
+
+# 动态权重矩阵的LRU缓存：(cache_key, 雨量站有无数据的组合) -> 权重矩阵，跨多次计算共享
+_mask_matrix_cache = OrderedDict()
+_instance_ids = itertools.count(1)
+
+# 按测站拆分的时间序列文件类型
+_SERIES_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+def weights_cache_key(polygon_shp_path, rain_gauge_shp_path, station_field, polygon_field=None):
+    """缓存键：面文件和雨量站文件各组成文件的内容哈希加所用字段"""
+    digest = hashlib.sha1()
+    for shp_path in (polygon_shp_path, rain_gauge_shp_path):
+        base = os.path.splitext(shp_path)[0]
+        for ext in _SHP_SIDECARS:
+            path = base + ext
+            if not os.path.exists(path):
+                continue
+            digest.update(ext.encode('ascii'))
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        digest.update(b'|')
+    digest.update(f"{WEIGHTS_VERSION}|{station_field}|{polygon_field or ''}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ThiessenWeights:
+    """子流域×雨量站面积权重矩阵
+
+    以稀疏三元组（子流域序号, 雨量站序号, 相交面积）保存，同一子流域和雨量站的多个相交
+    部分合并为一项。子流域中各雨量站的权重为其泰森多边形在子流域内的面积占比，各行权重之和为1。
+    """
+
+    def __init__(self, basin_names, station_names, rows, cols, areas):
+        self.basin_names = [str(name) for name in basin_names]
+        self.station_names = [str(name) for name in station_names]
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        areas = np.asarray(areas, dtype=np.float64)
+
+        # 合并重复项，并按子流域、雨量站排序
+        n_stations = max(len(self.station_names), 1)
+        unique_keys, inverse = np.unique(rows * n_stations + cols, return_inverse=True)
+        self.rows = unique_keys // n_stations
+        self.cols = unique_keys % n_stations
+        self.areas = np.bincount(inverse, weights=areas, minlength=len(unique_keys))
+
+        basin_areas = np.bincount(self.rows, weights=self.areas, minlength=len(self.basin_names))
+        self.weights = self.areas / basin_areas[self.rows]
+
+    @property
+    def shape(self):
+        return len(self.basin_names), len(self.station_names)
+
+    def to_dense(self):
+        """展开为 (子流域数, 雨量站数) 的稠密权重矩阵"""
+        matrix = np.zeros(self.shape)
+        matrix[self.rows, self.cols] = self.weights
+        return matrix
+
+    def to_frame(self):
+        """权重明细表：每个非零项一行"""
+        return pd.DataFrame({
+            '子流域': np.asarray(self.basin_names, dtype=object)[self.rows],
+            '雨量站': np.asarray(self.station_names, dtype=object)[self.cols],
+            '面积(km2)': self.areas,
+            '权重': self.weights,
+        })
+
+    def save(self, path):
+        """保存为npz文件（不含Python对象，读取时无需pickle）"""
+        with open(path, 'wb') as f:
+            np.savez(f, basin_names=np.array(self.basin_names, dtype=str),
+                     station_names=np.array(self.station_names, dtype=str),
+                     rows=self.rows, cols=self.cols, areas=self.areas)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['basin_names'].tolist(), data['station_names'].tolist(),
+                       data['rows'], data['cols'], data['areas'])
+
+    def areal_rainfall(self, series):
+        """计算各子流域的面雨量
+
+        series 为以时间为行、雨量站名称为列的表，返回以相同时间为行、子流域为列的表。
+        所有时段通过一次矩阵乘法完成；某时段雨量站缺测（NaN）时，只有权重中包含该雨量站的
+        子流域面雨量为NaN。缺少某个雨量站的时间序列时抛出 ValueError。
+        """
+        series = series.rename(columns=str)
+        missing = [name for name in self.station_names if name not in series.columns]
+        if missing:
+            raise ValueError(f"缺少以下雨量站的时间序列：{', '.join(missing)}")
+        values = series[self.station_names].to_numpy(dtype=float)
+        dense = self.to_dense()
+        # NaN乘以0仍为NaN，先按0计算，再将用到缺测雨量站的子流域置为NaN
+        rainfall = np.nan_to_num(values) @ dense.T
+        rainfall[(np.isnan(values).astype(float) @ (dense.T > 0)) > 0] = np.nan
+        return pd.DataFrame(rainfall, index=series.index, columns=self.basin_names)
+
+
+def _read_inputs(polygon_shp_path, rain_gauge_shp_path, station_field, polygon_field):
+    """读取面文件和雨量站文件，返回 (子流域, 雨量站, 子流域名称)，雨量站已转换到面文件坐标系"""
+    polygons = gpd.read_file(polygon_shp_path, encoding=resolve_shp_encoding(polygon_shp_path))
+    rain_gauges = gpd.read_file(rain_gauge_shp_path, encoding=resolve_shp_encoding(rain_gauge_shp_path))
+    if station_field not in rain_gauges.columns:
+        raise ValueError(f"雨量站文件中没有字段 {station_field}")
+    if polygon_field and polygon_field not in polygons.columns:
+        raise ValueError(f"面文件中没有字段 {polygon_field}")
+    if polygons.crs != rain_gauges.crs:
+        rain_gauges = rain_gauges.to_crs(polygons.crs)
+
+    # 子流域名称默认与泰森多边形输出的 polygon_N 一致
+    if polygon_field:
+        basin_names = polygons[polygon_field].astype(str).tolist()
+    else:
+        basin_names = [f"polygon_{i + 1}" for i in range(len(polygons))]
+    return polygons, rain_gauges, basin_names
+
+
+def _weights_from_frames(polygons, rain_gauges, station_field, basin_names):
+    """由子流域和雨量站生成一次泰森多边形并相交，得到面积权重矩阵"""
+    voronoi_gdf = build_station_voronoi(rain_gauges[[station_field, rain_gauges.geometry.name]], polygons.crs)
+    pieces, _ = intersect_polygons(voronoi_gdf, polygons[[polygons.geometry.name]])
+
+    rows, stations, areas = [], [], []
+    for position, group in pieces.items():
+        group = group[group['area_km2'] > 0]
+        rows.append(np.full(len(group), position, dtype=np.int64))
+        stations.append(group[station_field].astype(str).to_numpy())
+        areas.append(group['area_km2'].to_numpy())
+    if not rows:
+        return ThiessenWeights(basin_names, [], [], [], [])
+    stations = np.concatenate(stations)
+
+    # 只保留在子流域内有面积的雨量站，按雨量站文件中的顺序排列
+    used = set(stations)
+    station_names = [name for name in pd.unique(rain_gauges[station_field].astype(str)) if name in used]
+    cols = pd.Index(station_names).get_indexer(stations)
+    return ThiessenWeights(basin_names, station_names, np.concatenate(rows), cols, np.concatenate(areas))
+
+
+def compute_thiessen_weights(polygon_shp_path, rain_gauge_shp_path, station_field='Name', polygon_field=None,
+                             use_cache=True, cache_dir=None):
+    """计算子流域×雨量站面积权重矩阵，优先使用磁盘缓存
+
+    station_field 为雨量站名称字段，应与时间序列中的测站名称一致；polygon_field 为子流域名称字段，
+    为空时子流域依次命名为 polygon_1、polygon_2……。缓存以两个文件的内容哈希和所用字段为键，
+    任一文件被修改后自动失效。返回 (权重矩阵, 是否命中缓存)。
+    """
+    cache_dir = cache_dir or DEFAULT_WEIGHTS_DIR
+
+    if use_cache:
+        key = weights_cache_key(polygon_shp_path, rain_gauge_shp_path, station_field, polygon_field)
+        cache_path = os.path.join(cache_dir, key + '.npz')
+        if os.path.exists(cache_path):
+            try:
+                weights = ThiessenWeights.load(cache_path)
+                os.utime(cache_path)
+                return weights, True
+            except Exception as e:
+                print(f"读取权重缓存失败，将重新计算：{str(e)}")
+
+    polygons, rain_gauges, basin_names = _read_inputs(polygon_shp_path, rain_gauge_shp_path, station_field,
+                                                      polygon_field)
+    weights = _weights_from_frames(polygons, rain_gauges, station_field, basin_names)
+
+    if use_cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            weights.save(cache_path)
+        except OSError as e:
+            print(f"写入权重缓存失败：{str(e)}")
+
+    return weights, False
+
+
+class DynamicThiessenWeights:
+    """按各时段有数据的雨量站动态计算面积权重
+
+    缺测雨量站不参与该时段的泰森多边形划分。一次计算中时段按雨量站有无数据的组合分组，
+    每种组合只生成一次泰森多边形。得到的权重矩阵以 (cache_key, 组合) 为键保存在模块级的
+    LRU缓存中（最多 max_cache 项，最久未使用的先移出），同一面文件和雨量站文件再次计算
+    （如逐年分批计算长序列）时直接复用。cache_key 为空时只在本对象的多次计算之间复用。
+    """
+
+    def __init__(self, polygons, rain_gauges, station_field, basin_names, max_cache=DEFAULT_MASK_CACHE_SIZE,
+                 cache_key=None):
+        self.polygons = polygons[[polygons.geometry.name]]
+        self.rain_gauges = rain_gauges[[station_field, rain_gauges.geometry.name]].copy()
+        self.rain_gauges[station_field] = self.rain_gauges[station_field].astype(str)
+        self.station_field = station_field
+        self.basin_names = list(basin_names)
+        # 动态权重中任何雨量站都可能影响子流域，因此保留文件中的全部雨量站
+        self.station_names = pd.unique(self.rain_gauges[station_field]).tolist()
+        self._gauge_codes = pd.Index(self.station_names).get_indexer(self.rain_gauges[station_field])
+        self.max_cache = max_cache
+        self.cache_key = cache_key if cache_key is not None else f"instance-{next(_instance_ids)}"
+        self.builds = 0
+        self.hits = 0
+
+    @classmethod
+    def from_files(cls, polygon_shp_path, rain_gauge_shp_path, station_field='Name', polygon_field=None,
+                   max_cache=DEFAULT_MASK_CACHE_SIZE):
+        """由文件创建，缓存键与固定权重的磁盘缓存键相同，文件被修改后不会用到旧的权重矩阵"""
+        cache_key = weights_cache_key(polygon_shp_path, rain_gauge_shp_path, station_field, polygon_field)
+        polygons, rain_gauges, basin_names = _read_inputs(polygon_shp_path, rain_gauge_shp_path, station_field,
+                                                          polygon_field)
+        return cls(polygons, rain_gauges, station_field, basin_names, max_cache, cache_key)
+
+    def _build_matrix(self, mask):
+        gauges = self.rain_gauges[mask[self._gauge_codes]]
+        matrix = np.zeros((len(self.basin_names), len(self.station_names)))
+        if len(gauges) == 1:
+            # 只有一个雨量站有数据时其控制范围为全部子流域
+            matrix[:, self._gauge_codes[mask[self._gauge_codes]][0]] = 1.0
+            return matrix
+        weights = _weights_from_frames(self.polygons, gauges, self.station_field, self.basin_names)
+        cols = pd.Index(self.station_names).get_indexer(weights.station_names)
+        matrix[weights.rows, cols[weights.cols]] = weights.weights
+        # 不与任何泰森多边形相交的子流域没有面雨量
+        matrix[matrix.sum(axis=1) == 0] = np.nan
+        return matrix
+
+    def matrix(self, mask):
+        """返回雨量站有无数据为 mask 时的 (子流域数, 雨量站数) 权重矩阵，无数据雨量站的列为0
+
+        mask 为与 station_names 等长的布尔数组，至少有一个雨量站有数据。
+        """
+        mask = np.asarray(mask, dtype=bool)
+        key = (self.cache_key, np.packbits(mask).tobytes())
+        if key in _mask_matrix_cache:
+            _mask_matrix_cache.move_to_end(key)
+            self.hits += 1
+        else:
+            _mask_matrix_cache[key] = self._build_matrix(mask)
+            self.builds += 1
+        matrix = _mask_matrix_cache[key]
+        while len(_mask_matrix_cache) > self.max_cache:
+            _mask_matrix_cache.popitem(last=False)
+        return matrix
+
+    def areal_rainfall(self, series):
+        """计算各子流域的面雨量，缺测（NaN）的雨量站不参与对应时段的计算
+
+        时段按雨量站有无数据的组合分组，每组通过一次矩阵乘法完成；所有雨量站均缺测的时段面雨量为NaN。
+        series 中没有的雨量站视为全部缺测。
+        """
+        series = series.rename(columns=str)
+        missing = [name for name in self.station_names if name not in series.columns]
+        if missing:
+            print(f"警告：以下雨量站没有时间序列，按全部缺测处理：{', '.join(missing)}")
+        values = series.reindex(columns=self.station_names).to_numpy(dtype=float)
+        available = ~np.isnan(values)
+        values = np.where(available, values, 0.0)
+
+        result = np.full((len(values), len(self.basin_names)), np.nan)
+        masks, inverse = np.unique(available, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind='stable')
+        groups = np.split(order, np.cumsum(np.bincount(inverse, minlength=len(masks)))[:-1])
+        for mask, rows in zip(masks, groups):
+            if mask.any():
+                result[rows] = values[rows] @ self.matrix(mask).T
+        return pd.DataFrame(result, index=series.index, columns=self.basin_names)
+
+
+def clear_mask_cache():
+    """清空动态权重矩阵的LRU缓存，返回移除的项数"""
+    removed = len(_mask_matrix_cache)
+    _mask_matrix_cache.clear()
+    return removed
+
+
+def load_station_series(series_folder, time_column, value_column, station_column=None):
+    """读取按测站拆分的时间序列文件（如 split_csv_by_station 的输出）
+
+    测站名称取 station_column 列的第一个值，未指定时取文件名。同一文件中重复的时间只保留第一条。
+    返回以时间为行（升序）、测站为列的表。
+    """
+    columns = {}
+    for file_name in sorted(os.listdir(series_folder)):
+        stem, ext = os.path.splitext(file_name)
+        if ext.lower() not in _SERIES_EXTENSIONS or file_name.startswith('~$'):
+            continue
+        path = os.path.join(series_folder, file_name)
+        usecols = [time_column, value_column] + ([station_column] if station_column else [])
+        if ext.lower() == '.csv':
+            df = pd.read_csv(path, usecols=usecols)
+        else:
+            df = pd.read_excel(path, usecols=usecols)
+
+        station = str(df[station_column].iloc[0]) if station_column and len(df) else stem
+        if station in columns:
+            raise ValueError(f"测站 {station} 的时间序列出现在多个文件中")
+        values = pd.Series(pd.to_numeric(df[value_column], errors='coerce').to_numpy(), index=df[time_column])
+        duplicated = values.index.duplicated()
+        if duplicated.any():
+            print(f"警告：{file_name} 中有 {int(duplicated.sum())} 个重复时间，只保留第一条")
+            values = values[~duplicated]
+        columns[station] = values
+
+    if not columns:
+        raise ValueError(f"{series_folder} 中没有时间序列文件")
+    series = pd.concat(columns, axis=1).sort_index()
+    series.index.name = time_column
+    return series
+
+
+def compute_areal_rainfall(polygon_shp_path, rain_gauge_shp_path, series_folder, time_column, value_column,
+                           output_file=None, station_field='Name', station_column=None, polygon_field=None,
+                           use_cache=True, cache_dir=None, dynamic=False, max_cache=DEFAULT_MASK_CACHE_SIZE):
+    """由雨量站时间序列计算各子流域的面雨量
+
+    dynamic 为True时按各时段有数据的雨量站动态计算权重（见 DynamicThiessenWeights），
+    否则使用全部雨量站的固定权重。output_file 不为空时写出Excel，"面雨量"工作表为各时段
+    各子流域的面雨量，"权重"工作表为全部雨量站的权重明细。返回面雨量表。
+    """
+    weights, hit = compute_thiessen_weights(polygon_shp_path, rain_gauge_shp_path, station_field, polygon_field,
+                                            use_cache=use_cache, cache_dir=cache_dir)
+    print(f"面积权重矩阵：{weights.shape[0]} 个子流域 × {weights.shape[1]} 个雨量站"
+          f"{'（使用缓存）' if hit else ''}")
+
+    series = load_station_series(series_folder, time_column, value_column, station_column)
+    print(f"读取 {series.shape[1]} 个测站、{series.shape[0]} 个时段的时间序列")
+    if dynamic:
+        dynamic_weights = DynamicThiessenWeights.from_files(polygon_shp_path, rain_gauge_shp_path, station_field,
+                                                            polygon_field, max_cache=max_cache)
+        rainfall = dynamic_weights.areal_rainfall(series)
+        print(f"动态权重：{dynamic_weights.builds} 种雨量站组合生成了泰森多边形，"
+              f"缓存命中 {dynamic_weights.hits} 次")
+    else:
+        rainfall = weights.areal_rainfall(series)
+
+    if output_file:
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+            rainfall.to_excel(writer, sheet_name='面雨量')
+            weights.to_frame().to_excel(writer, sheet_name='权重', index=False)
+        print(f"面雨量已保存到 {output_file}")
+    return rainfall
@@ -0,0 +1,280 @@
+"""2D Zones 批处理命令行入口（无图形界面）
+
+根据JSON或TOML任务文件依次执行提取和分析表格生成，可在一次调用中处理多个流域，
+适合在水动力模型计算完成后由调度系统直接调用。
+
+用法：
+    python ZonesBatch.py 任务文件.toml [--workers N] [--only 名称 ...] [--fail-fast]
+                         [--report-dir 文件夹] [--trace-memory]
+
+任务文件顶层的键为各任务的默认值，jobs 列表中的每一项为一个任务（流域）；
+没有 jobs 时整个文件视为一个任务。相对路径以任务文件所在文件夹为基准。示例：
+
+    max_workers = 4
+    project_object = "赣江流域"
+
+    [[jobs]]
+    name = "赣江上游"
+    input_folder = "ganjiang_up/results"
+    output_file = "out/赣江上游.xlsx"
+    mesh_shp_file = "mesh/网格化区间.shp"
+    analysis_output_file = "out/赣江上游_分析.xlsx"
+    envelope_output_file = "out/赣江上游_包络.shp"
+    raster_output_folder = "out/赣江上游_栅格"
+    raster_cell_size = 5.0
+
+退出码：
+    0  全部任务成功
+    1  有任务执行失败
+    2  任务文件无法读取或配置有误
+    3  全部任务执行完成，但有方案处理失败
+    130 被中断
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from ZonesCore import extract_shp_to_excel, generate_envelope_layer, rasterize_zones
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+EXIT_OK = 0
+EXIT_JOB_FAILED = 1
+EXIT_CONFIG_ERROR = 2
+EXIT_PARTIAL = 3
+EXIT_INTERRUPTED = 130
+
+# 任务可用的配置项及默认值
+JOB_DEFAULTS = {
+    'name': None,
+    'input_folder': None,
+    'output_file': None,
+    'clip_mesh': None,
+    'mesh_shp_file': None,
+    'clipped_shp_output_folder': None,
+    'clipped_output_format': 'shp',
+    'store_dir': None,
+    'store_format': 'parquet',
+    'cache_dir': None,
+    'use_clip_cache': True,
+    'max_workers': 1,
+    'chunk_size': None,
+    'project_object': '',
+    'analysis_output_file': None,
+    'envelope_output_file': None,
+    'raster_output_folder': None,
+    'raster_cell_size': None,
+    'stats_config': None,
+    'report_file': None,
+    'trace_memory': False,
+}
+
+# 需要按任务文件位置解析的路径配置项
+_PATH_KEYS = ('input_folder', 'output_file', 'mesh_shp_file', 'clipped_shp_output_folder', 'store_dir',
+              'cache_dir', 'analysis_output_file', 'envelope_output_file', 'raster_output_folder', 'stats_config',
+              'report_file')
+
+
+class JobConfigError(Exception):
+    """任务文件无法读取或配置有误"""
+
+
+def load_job_file(path):
+    """读取JSON或TOML任务文件，返回配置字典"""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == '.toml':
+            if tomllib is None:
+                raise JobConfigError("读取TOML任务文件需要 Python 3.11 及以上版本或安装 tomli")
+            with open(path, 'rb') as f:
+                return tomllib.load(f)
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except JobConfigError:
+        raise
+    except Exception as e:
+        raise JobConfigError(f"无法读取任务文件 {path}：{str(e)}")
+
+
+def build_jobs(config, base_dir):
+    """由配置字典生成任务列表，合并默认值、解析相对路径并检查必填项"""
+    if not isinstance(config, dict):
+        raise JobConfigError("任务文件的顶层必须是键值表")
+    defaults = {key: value for key, value in config.items() if key != 'jobs'}
+    entries = config.get('jobs', [{}])
+    if not isinstance(entries, list) or not entries:
+        raise JobConfigError("jobs 必须是非空列表")
+
+    jobs = []
+    for index, entry in enumerate(entries):
+        job = dict(JOB_DEFAULTS)
+        job.update(defaults)
+        job.update(entry)
+        unknown = sorted(set(job) - set(JOB_DEFAULTS))
+        if unknown:
+            raise JobConfigError(f"第 {index + 1} 个任务包含未知配置项：{', '.join(unknown)}")
+
+        for key in _PATH_KEYS:
+            if job[key]:
+                job[key] = os.path.join(base_dir, os.path.expanduser(job[key]))
+        if not job['name']:
+            job['name'] = os.path.basename(os.path.normpath(job['input_folder'] or '')) or f"任务{index + 1}"
+        # 指定了网格化区间文件时默认进行裁剪
+        if job['clip_mesh'] is None:
+            job['clip_mesh'] = bool(job['mesh_shp_file'])
+
+        if not job['input_folder']:
+            raise JobConfigError(f"任务 {job['name']} 未指定 input_folder")
+        if not job['output_file'] and not job['store_dir']:
+            raise JobConfigError(f"任务 {job['name']} 未指定 output_file 或 store_dir")
+        if job['clip_mesh'] and not job['mesh_shp_file']:
+            raise JobConfigError(f"任务 {job['name']} 需要裁剪，但未指定 mesh_shp_file")
+        if job['raster_output_folder'] and not job['raster_cell_size']:
+            raise JobConfigError(f"任务 {job['name']} 需要生成栅格，但未指定 raster_cell_size")
+        jobs.append(job)
+
+    names = [job['name'] for job in jobs]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise JobConfigError(f"任务名称重复：{', '.join(duplicated)}")
+    return jobs
+
+
+def _check_inputs(job):
+    """检查任务的输入文件是否存在，返回错误信息或None"""
+    if not os.path.isdir(job['input_folder']):
+        return f"输入文件夹不存在：{job['input_folder']}"
+    if job['clip_mesh'] and not os.path.exists(job['mesh_shp_file']):
+        return f"网格化区间SHP文件不存在：{job['mesh_shp_file']}"
+    return None
+
+
+def run_job(job):
+    """执行单个任务，返回 (是否成功, 失败的方案列表)"""
+    error = _check_inputs(job)
+    if error:
+        print(error)
+        return False, []
+
+    failed = []
+    # 提取阶段找到的方案数
+    found = []
+
+    def progress(event):
+        if event['event'] == 'scenarios_found' and not found:
+            found.append(event['total'])
+        elif event['event'] == 'scenario_failed':
+            failed.append(event['name'])
+
+    for path in (job['output_file'], job['analysis_output_file'], job['envelope_output_file']):
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # 分析表格在提取过程中同步生成，不再读取提取结果
+    extract_shp_to_excel(job['input_folder'], job['output_file'], job['clip_mesh'], job['mesh_shp_file'],
+                         job['clipped_shp_output_folder'], max_workers=job['max_workers'],
+                         clipped_output_format=job['clipped_output_format'],
+                         use_clip_cache=job['use_clip_cache'], store_dir=job['store_dir'],
+                         store_format=job['store_format'], cache_dir=job['cache_dir'],
+                         analysis_output_file=job['analysis_output_file'], project_object=job['project_object'],
+                         stats_config=job['stats_config'], report_file=job['report_file'], trace_memory=job['trace_memory'],
+                         chunk_size=job['chunk_size'], progress=progress)
+    # 没有找到方案或全部方案都失败时，任务视为失败
+    if not found or found[0] == 0:
+        print(f"输入文件夹中没有找到2D Zones.shp：{job['input_folder']}")
+        return False, []
+    if len(set(failed)) >= found[0]:
+        print(f"任务 {job['name']} 的全部 {found[0]} 个方案处理失败")
+        return False, failed
+    if job['envelope_output_file']:
+        # 包络图层直接由各方案的原始属性表生成，连接到第一个方案的单元几何
+        generate_envelope_layer(job['input_folder'], job['envelope_output_file'], raise_errors=True)
+    if job['raster_output_folder']:
+        # 各方案栅格化为GeoTIFF，失败的方案计入失败列表
+        rasterize_zones(job['input_folder'], job['raster_output_folder'], job['raster_cell_size'],
+                        max_workers=job['max_workers'], progress=progress, raise_errors=True)
+    return True, failed
+
+
+def run_jobs(jobs, fail_fast=False):
+    """依次执行任务，返回退出码"""
+    job_failed = False
+    partial = False
+    for index, job in enumerate(jobs):
+        print(f"\n===== [{index + 1}/{len(jobs)}] {job['name']} =====")
+        start = time.perf_counter()
+        try:
+            ok, failed = run_job(job)
+        except Exception as e:
+            print(f"任务 {job['name']} 执行失败：{str(e)}")
+            ok, failed = False, []
+
+        elapsed = time.perf_counter() - start
+        if not ok:
+            job_failed = True
+            print(f"任务 {job['name']} 失败，用时 {elapsed:.1f}s")
+            if fail_fast:
+                break
+        elif failed:
+            partial = True
+            print(f"任务 {job['name']} 完成，用时 {elapsed:.1f}s，{len(failed)} 个方案处理失败：{', '.join(failed)}")
+        else:
+            print(f"任务 {job['name']} 完成，用时 {elapsed:.1f}s")
+
+    if job_failed:
+        return EXIT_JOB_FAILED
+    return EXIT_PARTIAL if partial else EXIT_OK
+
+
+def main(argv=None):
+    # 打包为exe后，进程池的子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="2D Zones 批处理：按任务文件执行提取和分析表格生成")
+    parser.add_argument('job_file', help="JSON或TOML任务文件")
+    parser.add_argument('--workers', type=int, help="并行进程数，覆盖任务文件中的 max_workers")
+    parser.add_argument('--only', action='append', metavar='名称', help="只执行指定名称的任务，可重复指定")
+    parser.add_argument('--fail-fast', action='store_true', help="任务失败时不再执行后续任务")
+    parser.add_argument('--report-dir', help="将各任务的运行报告（<任务名称>_report.json）保存到此文件夹")
+    parser.add_argument('--trace-memory', action='store_true', help="运行报告中记录各阶段的内存分配峰值（较慢）")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_job_file(args.job_file)
+        jobs = build_jobs(config, os.path.dirname(os.path.abspath(args.job_file)))
+        if args.only:
+            missing = sorted(set(args.only) - {job['name'] for job in jobs})
+            if missing:
+                raise JobConfigError(f"任务文件中没有以下任务：{', '.join(missing)}")
+            jobs = [job for job in jobs if job['name'] in args.only]
+    except JobConfigError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_CONFIG_ERROR
+
+    for job in jobs:
+        if args.workers is not None:
+            job['max_workers'] = args.workers
+        if args.report_dir:
+            job['report_file'] = os.path.join(args.report_dir, f"{job['name']}_report.json")
+        if args.trace_memory:
+            job['trace_memory'] = True
+
+    try:
+        return run_jobs(jobs, fail_fast=args.fail_fast)
+    except KeyboardInterrupt:
+        print("\n已中断", file=sys.stderr)
+        return EXIT_INTERRUPTED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
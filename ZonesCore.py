@@ -0,0 +1,924 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pyogrio
+
+from MeshClip import load_mesh_clipper, mesh_cache_key
+from ShpEncoding import resolve_shp_encoding
+from ZonesEnvelope import ScenarioEnvelope
+from ZonesManifest import ScenarioManifest
+from ZonesRaster import DEFAULT_TILE_SIZE, RASTER_FIELDS, rasterize_scenario
+from ZonesProfile import StageProfiler, count_vertices, write_report
+from ZonesStats import build_analysis_table, build_metric_tables, load_stats_config, metric_columns, scenario_statistics
+from ZonesStore import (ClippedLayerWriter, ScenarioStoreWriter, StreamingExcelWriter, export_store_to_excel,
+                        is_scenario_store, iter_scenarios, read_overflow_sheets)
+
+try:
+    import pyarrow  # noqa: F401
+    # 安装了pyarrow时通过Arrow批量读取属性表，避免逐条构造Python对象
+    _ARROW_READ_KWARGS = {'use_arrow': True}
+except ImportError:
+    _ARROW_READ_KWARGS = {}
+
+try:
+    import python_calamine  # noqa: F401
+    # 安装了python-calamine时使用Rust实现的解析器读取Excel
+    _EXCEL_READ_ENGINE = 'calamine'
+except ImportError:
+    _EXCEL_READ_ENGINE = 'openpyxl'
+
+
+# 需要提取的原始列
+REQUIRED_COLUMNS = ['element_no', 'AREA2D', 'DEPTH2D', 'T_FLOOD_DU', 'T_INUDATIO', 'T_PEAK_2D']
+
+# 分析统计所需的列
+ANALYSIS_COLUMNS = ['element_no', '淹没水深(m)', '淹没面积(km2)', '淹没历时(h)']
+
+# 分批处理大文件时默认的每批要素数
+DEFAULT_CHUNK_SIZE = 500000
+
+# 工作进程中共享的裁剪引擎，由进程池初始化函数设置
+_worker_clipper = None
+_worker_clipped_writer = None
+_worker_profile_options = (False, False)
+
+# 工作进程中已打开的Excel文件及需要读取的列，由读取进程池初始化函数设置
+_worker_excel_file = None
+_worker_excel_columns = None
+
+
+class JobCancelled(Exception):
+    """用户取消了正在执行的任务"""
+
+
+def _emit(progress, event, **data):
+    """向进度回调发送结构化事件"""
+    if progress is not None:
+        progress(dict(event=event, **data))
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled("任务已取消")
+
+
+def _safe_file_name(name):
+    """去掉不能用于Windows文件名的字符"""
+    return "".join(c for c in name if c.isalnum() or c in (' ', '.', '_', '-')).rstrip()
+
+
+def _collect_tasks(main_folder):
+    """收集待处理的SHP文件，返回 (工作表名称, 显示名称, shp路径, 裁剪输出文件名) 列表"""
+    # 首先检查主文件夹中是否直接包含SHP文件
+    shp_path = os.path.join(main_folder, "2D Zones.shp")
+    if os.path.exists(shp_path):
+        return [('Main_Folder', '主文件夹', shp_path, "Main_Folder_Clipped.shp")], []
+
+    tasks = []
+    warnings = []
+    # 遍历主文件夹下的所有子文件夹，按名称排序以保证工作表顺序稳定
+    for folder_name in sorted(os.listdir(main_folder)):
+        folder_path = os.path.join(main_folder, folder_name)
+
+        # 跳过非文件夹的文件
+        if not os.path.isdir(folder_path):
+            continue
+
+        # 检查shp文件是否存在
+        shp_path = os.path.join(folder_path, "2D Zones.shp")
+        if not os.path.exists(shp_path):
+            warnings.append(f"警告：在文件夹 {folder_name} 中未找到2D Zones.shp")
+            continue
+
+        # 处理文件名，确保符合Windows文件命名规范
+        safe_folder_name = _safe_file_name(folder_name)
+        tasks.append((folder_name, f"文件夹 {folder_name}", shp_path, f"{safe_folder_name}_Clipped.shp"))
+    return tasks, warnings
+
+
+def _derive_columns(df):
+    """只保留指定的列并添加计算列，没有任何指定列时返回None"""
+    available_columns = [col for col in REQUIRED_COLUMNS if col in df.columns]
+    if not available_columns:
+        return None
+
+    df_filtered = df[available_columns].copy()
+    if 'AREA2D' in df_filtered.columns:
+        df_filtered['淹没面积(km2)'] = df_filtered['AREA2D'] / 1000000
+    if 'DEPTH2D' in df_filtered.columns:
+        df_filtered['淹没水深(m)'] = df_filtered['DEPTH2D']
+    if 'T_FLOOD_DU' in df_filtered.columns:
+        df_filtered['淹没历时(h)'] = df_filtered['T_FLOOD_DU'] / 3600
+    if 'T_INUDATIO' in df_filtered.columns:
+        df_filtered['洪水到达时间(h)'] = df_filtered['T_INUDATIO'] / 3600
+    return df_filtered
+
+
+def _read_zones(shp_path, label, logs, **kwargs):
+    """按检测出的编码读取SHP文件，其余参数传给 gpd.read_file"""
+    encoding = resolve_shp_encoding(shp_path)
+    data = gpd.read_file(shp_path, encoding=encoding, **kwargs)
+    logs.append(f"使用编码 {encoding} 成功读取{label}中的SHP文件")
+    return data
+
+
+def _clip_zones(gdf, clipper, clipped_writer, sheet_name, clipped_name, label, logs, profiler):
+    """从gdf中擦除与网格化区间重叠的部分
+
+    clipped_writer 为空时不输出裁剪后的图层。裁剪失败时抛出异常，该方案按处理失败计，
+    不会把未裁剪的数据当作结果输出。
+    """
+    try:
+        # 确保坐标系一致
+        if gdf.crs != clipper.crs:
+            with profiler.stage('to_crs') as record:
+                gdf = gdf.to_crs(clipper.crs)
+                record['rows'] = len(gdf)
+
+        # 执行擦除操作（从gdf中移除与网格化区间重叠的部分）
+        with profiler.stage('clip') as record:
+            gdf, (n_outside, n_inside, n_boundary) = clipper.erase(gdf)
+            record['rows'] = len(gdf)
+            if profiler.enabled:
+                record['vertices'] = count_vertices(gdf.geometry.values)
+        logs.append(f"{label}：区间外单元 {n_outside} 个，区间内单元 {n_inside} 个，边界单元 {n_boundary} 个")
+
+        # 如果需要输出裁剪后的图层
+        if clipped_writer is not None:
+            with profiler.stage('write_shp') as record:
+                clipped_writer.write(gdf, sheet_name, clipped_name)
+                record['rows'] = len(gdf)
+            logs.append(f"{label}裁剪后的文件已保存至：{clipped_writer.describe(sheet_name, clipped_name)}")
+
+    except Exception as e:
+        raise RuntimeError(f"裁剪{label}中的SHP文件时出错：{str(e)}") from e
+    return gdf
+
+
+def _process_folder(task, clipper, clipped_writer, profile=False, trace_memory=False, chunk=None):
+    """读取、裁剪并转换单个方案的SHP文件
+
+    返回包含工作表名称、结果数据和日志的字典。该函数可在工作进程中运行，
+    因此日志不直接打印，而是交给写入方统一输出。profile 为True时在 stages
+    中返回各阶段的详细性能记录（见 ZonesProfile.StageProfiler）。
+    chunk 为 (批次序号, 起始要素, 要素数) 时只处理该批要素。分批处理或裁剪后图层写入
+    同一个GeoPackage时，裁剪后的数据放在结果的 clipped 中，由写入方按顺序写入。
+    """
+    sheet_name, label, shp_path, clipped_name = task
+    read_kwargs = {}
+    if chunk is not None:
+        index, offset, size = chunk
+        label = f"{label}第{index + 1}批"
+        read_kwargs = {'skip_features': offset, 'max_features': size}
+    profiler = StageProfiler(sheet_name, profile, trace_memory)
+    result = {'sheet_name': sheet_name, 'data': None, 'columns': [], 'logs': [], 'stages': profiler.records}
+    logs = result['logs']
+
+    try:
+        if clipper is None:
+            # 不裁剪时只读取所需的属性列，不解析几何
+            with profiler.stage('read') as record:
+                df = _read_zones(shp_path, label, logs, columns=REQUIRED_COLUMNS, ignore_geometry=True,
+                                 **read_kwargs, **_ARROW_READ_KWARGS)
+                record['rows'] = len(df)
+        else:
+            with profiler.stage('read') as record:
+                gdf = _read_zones(shp_path, label, logs, **read_kwargs)
+                record['rows'] = len(gdf)
+                if profile:
+                    record['vertices'] = count_vertices(gdf.geometry.values)
+            deferred = clipped_writer is not None and (chunk is not None or clipped_writer.single_file)
+            gdf = _clip_zones(gdf, clipper, None if deferred else clipped_writer, sheet_name, clipped_name, label,
+                              logs, profiler)
+            if deferred:
+                result['clipped'] = gdf
+            # 移除几何列
+            df = pd.DataFrame(gdf.drop(columns='geometry'))
+
+        with profiler.stage('derive') as record:
+            result['data'] = _derive_columns(df)
+            result['columns'] = [col for col in REQUIRED_COLUMNS if col in df.columns]
+            record['rows'] = len(df)
+
+    except Exception as e:
+        logs.append(f"处理{label}时发生错误：{str(e)}")
+        result['error'] = True
+
+    result['timings'] = profiler.timings()
+    return result
+
+
+def _init_worker(clipper, clipped_writer, profile_options=(False, False)):
+    """进程池初始化函数：每个工作进程只接收并重建一次裁剪引擎"""
+    global _worker_clipper, _worker_clipped_writer, _worker_profile_options
+    _worker_clipper = clipper
+    _worker_clipped_writer = clipped_writer
+    _worker_profile_options = profile_options
+
+
+def _process_folder_in_worker(item):
+    """在工作进程中处理单个方案或单个方案的一批要素"""
+    task, chunk = item
+    return _process_folder(task, _worker_clipper, _worker_clipped_writer, *_worker_profile_options, chunk=chunk)
+
+
+def _plan_work(tasks, chunk_size):
+    """将待处理任务展开为 (任务, 批次) 列表，并返回各分批方案的批次数
+
+    chunk_size 为空或方案的要素数不超过 chunk_size 时整个方案作为一项（批次为None）。
+    """
+    items = []
+    chunk_counts = {}
+    for task in tasks:
+        total = pyogrio.read_info(task[2])['features'] if chunk_size else 0
+        if total <= (chunk_size or 0):
+            items.append((task, None))
+            continue
+        offsets = range(0, total, chunk_size)
+        chunk_counts[task[0]] = len(offsets)
+        items.extend((task, (index, offset, chunk_size)) for index, offset in enumerate(offsets))
+    return items, chunk_counts
+
+
+def _iter_results(items, clipper, clipped_writer, max_workers, profile=False, trace_memory=False):
+    """按顺序逐个产出各项 (任务, 批次) 的处理结果，max_workers大于1时使用进程池并行处理
+
+    进程池中同时提交的项数不超过进程数的两倍，写入较慢时已完成的结果不会无限堆积。
+    """
+    if max_workers is None or max_workers < 1:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(items))
+
+    if max_workers <= 1:
+        for task, chunk in items:
+            yield _process_folder(task, clipper, clipped_writer, profile, trace_memory, chunk)
+        return
+
+    print(f"使用 {max_workers} 个进程并行处理 {len(items)} 项")
+    executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                   initargs=(clipper, clipped_writer, (profile, trace_memory)))
+    try:
+        # 按提交顺序取结果，保证工作表顺序稳定
+        remaining = iter(items)
+        pending = deque(executor.submit(_process_folder_in_worker, item)
+                        for item in _take(remaining, 2 * max_workers))
+        while pending:
+            result = pending.popleft().result()
+            for item in _take(remaining, 1):
+                pending.append(executor.submit(_process_folder_in_worker, item))
+            yield result
+    finally:
+        # 提前结束（如用户取消）时丢弃尚未开始的任务
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _take(iterator, n):
+    """从迭代器中取出至多n项"""
+    for _ in range(n):
+        item = next(iterator, None)
+        if item is None:
+            return
+        yield item
+
+
+def _write_chunked_scenario(task, n_chunks, fresh_results, writer, clipped_writer, stats_columns, profiler):
+    """按顺序取出分批方案各批的处理结果，逐批写入并输出日志，返回与 _process_folder 结构相同的汇总结果
+
+    汇总结果的 data 只包含统计所需的列（stats_columns 为None时为None），rows 为写入的总行数，
+    written 表示已写入输出（方案中没有任何指定列时不写入）。
+    任一批出错时不再写入后续各批，已写入Excel的部分保留在工作表中。
+    """
+    sheet_name, label, _, clipped_name = task
+    summary = {'sheet_name': sheet_name, 'data': None, 'columns': [], 'logs': [], 'stages': [], 'timings': {},
+               'rows': 0}
+    stats_parts = []
+    taken = [0]
+
+    def take():
+        result = next(fresh_results)
+        taken[0] += 1
+        for line in result['logs']:
+            print(line)
+        summary['stages'].extend(result['stages'])
+        for stage, seconds in result['timings'].items():
+            summary['timings'][stage] = summary['timings'].get(stage, 0) + seconds
+        if result.get('error') or result['data'] is None:
+            summary['error'] = bool(result.get('error')) or taken[0] > 1
+            return result
+        if result.get('clipped') is not None:
+            # 裁剪后的几何按批次顺序追加到同一个文件或图层
+            with profiler.stage('write_shp') as record:
+                clipped_writer.write(result['clipped'], sheet_name, clipped_name, append=taken[0] > 1)
+                record['rows'] = len(result['clipped'])
+            summary['clipped_shp'] = clipped_writer.describe(sheet_name, clipped_name)
+        return result
+
+    def frames(first):
+        result = first
+        while True:
+            df = result['data']
+            summary['rows'] += len(df)
+            if stats_columns is not None:
+                stats_parts.append(df[[col for col in stats_columns if col in df.columns]])
+            yield df
+            if taken[0] == n_chunks:
+                return
+            result = take()
+            if summary.get('error'):
+                return
+
+    first = take()
+    summary['columns'] = first['columns']
+    if not summary.get('error') and first['data'] is not None:
+        # 写入阶段包含等待各批处理结果的时间
+        with profiler.stage('write') as record:
+            writer.write_chunks(sheet_name, frames(first))
+            record['rows'] = summary['rows']
+        summary['written'] = True
+        if summary.get('error'):
+            print(f"{label}分批处理出错，已写入的 {summary['rows']} 行保留在输出中")
+        elif summary.get('clipped_shp'):
+            print(f"{label}裁剪后的文件已保存至：{summary['clipped_shp']}")
+    # 出错时取出该方案剩余各批的结果，保持与后续方案的顺序一致
+    while taken[0] < n_chunks:
+        next(fresh_results)
+        taken[0] += 1
+    if stats_parts:
+        summary['data'] = pd.concat(stats_parts, ignore_index=True)
+    return summary
+
+
+def extract_shp_to_excel(main_folder, output_file, clip_mesh=False, mesh_shp_file=None, clipped_shp_output_folder=None,
+                         max_workers=1, use_clip_cache=True, store_dir=None, store_format='parquet', cache_dir=None,
+                         analysis_output_file=None, project_object='', stats_config=None, report_file=None,
+                         trace_memory=False, chunk_size=None, clipped_output_format='shp', progress=None,
+                         cancel_event=None):
+    """改进后的功能函数：提取shp文件到Excel，包含指定列和计算列，支持裁剪处理
+
+    max_workers 为并行处理的进程数，1表示逐个处理，0或None表示使用全部CPU核心。
+    各方案在工作进程中读取、裁剪和转换，由主进程按文件夹名称顺序统一写入Excel。
+    use_clip_cache 控制是否使用网格化区间的磁盘缓存（见 MeshClip.load_mesh_clipper）。
+    指定 store_dir 时，各方案写入列式中间数据目录（store_format 为 'parquet' 或 'arrow'），
+    Excel改为由中间数据导出，output_file 为空时不导出Excel。
+    指定 cache_dir 时启用增量提取：文件内容和裁剪设置都未变化的方案直接使用缓存结果。
+    指定 analysis_output_file 时在提取过程中同步统计各方案，同一次运行中直接输出分析表格，
+    无需再读取提取结果；stats_config 为多指标统计配置（见 ZonesStats.load_stats_config）。
+    指定 report_file 时按方案记录读取、坐标转换、裁剪、写入等各阶段的墙钟时间、CPU时间、
+    内存峰值以及行数和顶点数，写为JSON或CSV运行报告；trace_memory 为True时另用
+    tracemalloc 记录各阶段的内存分配峰值。
+    指定 chunk_size 时，要素数超过 chunk_size 的方案按固定要素数分批读取、裁剪、转换并追加
+    写入，内存峰值只与 chunk_size 有关，输出与整体处理相同；同步统计时只保留统计所需的列。
+    分批处理的方案不写入增量提取缓存。
+    clipped_output_format 为裁剪后图层的输出格式：'shp'（每个方案一个shp文件）、'gpkg'
+    （所有方案写入同一个GeoPackage，每个方案一个图层）或 'fgb'（每个方案一个带空间索引的
+    FlatGeobuf文件），见 ZonesStore.ClippedLayerWriter。
+    progress 为进度回调，接收包含 event 字段的字典；cancel_event 被设置后在下一个方案
+    开始前抛出 JobCancelled。
+    """
+    run_start = time.perf_counter()
+    profile = bool(report_file)
+    if analysis_output_file:
+        # 配置有误时在开始处理前报错
+        stats_config = load_stats_config(stats_config)
+    # 主进程中各阶段（加载网格化区间、写入、导出等）的性能记录
+    run_profiler = StageProfiler('', profile, trace_memory)
+    report_records = []
+
+    # 如果需要裁剪网格化区间，先读取网格化区间文件并建立裁剪索引（整个运行只建立一次）。
+    # 读取失败时直接报错，不输出未裁剪的结果
+    clipper = None
+    if clip_mesh and mesh_shp_file:
+        if not os.path.exists(mesh_shp_file):
+            raise FileNotFoundError(f"网格化区间SHP文件不存在：{mesh_shp_file}")
+        try:
+            with run_profiler.stage('load_mesh'):
+                clipper, from_cache = load_mesh_clipper(mesh_shp_file, use_cache=use_clip_cache)
+        except Exception as e:
+            raise RuntimeError(f"读取网格化区间文件时出错：{str(e)}") from e
+        print("成功从缓存加载网格化区间" if from_cache else "成功加载网格化区间文件")
+
+    tasks, warnings = _collect_tasks(main_folder)
+    for warning in warnings:
+        print(warning)
+
+    # 创建写入对象：列式中间数据或Excel
+    if store_dir:
+        writer = ScenarioStoreWriter(store_dir, store_format)
+        print(f"方案数据将以 {store_format} 格式保存至：{store_dir}")
+    else:
+        # 拆分工作表避开全部方案名称
+        writer = StreamingExcelWriter(output_file, reserved_names=[task[0] for task in tasks])
+
+    # 记录成功处理的文件夹数量
+    processed_count = 0
+    # 同步生成分析表格时，各方案的统计结果
+    scenario_stats = []
+
+    # 如果需要输出裁剪后的图层，确保输出文件夹存在
+    clipped_writer = None
+    if clip_mesh and clipped_shp_output_folder:
+        output_shp_dir = Path(clipped_shp_output_folder)
+        output_shp_dir.mkdir(parents=True, exist_ok=True)
+        clipped_writer = ClippedLayerWriter(output_shp_dir, clipped_output_format)
+        print(f"裁剪后的{clipped_output_format}文件将保存至：{output_shp_dir}")
+    if clipper is None:
+        clipped_writer = None
+
+    # 增量提取：找出文件内容或裁剪设置发生变化的方案，只重新处理这些方案
+    manifest = None
+    cached_results = {}
+    pending_tasks = tasks
+    if cache_dir and tasks:
+        manifest = ScenarioManifest(cache_dir)
+        settings = {
+            'clip': mesh_cache_key(mesh_shp_file, None) if clipper is not None else None,
+            'clipped_output': clipped_writer.output_dir if clipped_writer is not None else None,
+            'clipped_format': clipped_writer.output_format if clipped_writer is not None else None,
+        }
+        for task in tasks:
+            cached = manifest.lookup(task[0], task[2], settings)
+            if cached is not None:
+                cached_results[task[0]] = cached
+        pending_tasks = [task for task in tasks if task[0] not in cached_results]
+        print(f"增量提取：{len(cached_results)} 个方案未变化，{len(pending_tasks)} 个方案需要重新处理")
+
+    # 超过 chunk_size 的方案展开为多批，各批依次（或在进程池中并行）处理
+    work_items, chunk_counts = _plan_work(pending_tasks, chunk_size)
+    if chunk_counts:
+        print(f"{len(chunk_counts)} 个方案的要素数超过 {chunk_size}，将分批处理")
+    stats_columns = _analysis_columns(stats_config) if analysis_output_file else None
+
+    _emit(progress, 'scenarios_found', total=len(tasks), cached=len(cached_results))
+    fresh_results = _iter_results(work_items, clipper, clipped_writer, max_workers, profile, trace_memory)
+    try:
+        for index, task in enumerate(tasks):
+            _check_cancelled(cancel_event)
+            _emit(progress, 'scenario_started', name=task[0], index=index, total=len(tasks))
+            profiler = StageProfiler(task[0], profile, trace_memory)
+            if task[0] in cached_results:
+                result = cached_results[task[0]]
+                print(f"{task[1]}未变化，使用缓存结果")
+            elif task[0] in chunk_counts:
+                # 分批方案边取结果边写入，不写入增量提取缓存
+                result = _write_chunked_scenario(task, chunk_counts[task[0]], fresh_results, writer,
+                                                 clipped_writer, stats_columns, profiler)
+            else:
+                # 新处理的结果与待处理任务顺序一致
+                result = next(fresh_results)
+                if result.get('clipped') is not None:
+                    # 写入同一个GeoPackage的图层由主进程按顺序写入
+                    clipped = result.pop('clipped')
+                    with profiler.stage('write_shp') as record:
+                        clipped_writer.write(clipped, task[0], task[3])
+                        record['rows'] = len(clipped)
+                    result['logs'].append(f"{task[1]}裁剪后的文件已保存至：{clipped_writer.describe(task[0], task[3])}")
+                if manifest is not None and not result.get('error'):
+                    clipped_shp = clipped_writer.target(task[0], task[3])[0] if clipped_writer is not None else None
+                    manifest.store(task[0], settings, result, clipped_shp)
+
+            for line in result['logs']:
+                print(line)
+            report_records.extend(result.get('stages', []))
+            if result.get('error'):
+                report_records.extend(profiler.records)
+                _emit(progress, 'scenario_failed', name=task[0], index=index, total=len(tasks))
+                continue
+
+            sheet_name = result['sheet_name']
+            df_filtered = result['data']
+            rows = result['rows'] if result.get('written') else 0 if df_filtered is None else len(df_filtered)
+            if result.get('written'):
+                processed_count += 1
+                print(f"成功处理：{sheet_name}，提取列: {result['columns']}")
+                if analysis_output_file:
+                    # 各批中统计所需的列已合并
+                    with profiler.stage('statistics'):
+                        _collect_statistics(scenario_stats, sheet_name, df_filtered, stats_config)
+            elif df_filtered is not None:
+                # 将数据写入Excel的sheet
+                with profiler.stage('write') as record:
+                    writer.write(sheet_name, df_filtered)
+                    record['rows'] = len(df_filtered)
+                processed_count += 1
+                print(f"成功处理：{sheet_name}，提取列: {result['columns']}")
+                if analysis_output_file:
+                    # 数据仍在内存中，直接统计
+                    with profiler.stage('statistics'):
+                        _collect_statistics(scenario_stats, sheet_name, df_filtered, stats_config)
+            else:
+                # 如果没有指定的列，创建一个包含提示信息的工作表
+                warning_df = pd.DataFrame({'提示': ['未找到指定的列']})
+                with profiler.stage('write'):
+                    writer.write(sheet_name, warning_df)
+                print(f"{sheet_name} 中的SHP文件未包含指定的列")
+            report_records.extend(profiler.records)
+            timings = dict(result.get('timings', {}), **profiler.timings())
+            _emit(progress, 'scenario_done', name=sheet_name, index=index, total=len(tasks), rows=rows,
+                  timings=timings)
+    finally:
+        fresh_results.close()
+
+    # 如果没有处理任何文件夹，则创建一个默认的工作表
+    if processed_count == 0:
+        # 创建一个空的DataFrame作为默认工作表
+        default_df = pd.DataFrame({'提示': ['未找到任何有效的"2D Zones.shp"文件']})
+        writer.write('处理结果', default_df)
+        print("未找到任何有效的SHP文件，已创建默认工作表")
+    else:
+        print(f"共处理了 {processed_count} 个文件夹")
+
+    # 保存并关闭输出文件
+    with run_profiler.stage('close'):
+        writer.close()
+    if manifest is not None:
+        manifest.save({task[0] for task in tasks})
+    if analysis_output_file:
+        with run_profiler.stage('write_analysis'):
+            _write_analysis_table(scenario_stats, analysis_output_file, project_object, stats_config)
+        print(f"分析表格已保存至：{analysis_output_file}")
+    if store_dir and output_file:
+        # 由列式中间数据导出Excel
+        with run_profiler.stage('export_excel'):
+            export_store_to_excel(store_dir, output_file)
+
+    if report_file:
+        run_info = {
+            'function': 'extract_shp_to_excel',
+            'input': str(main_folder),
+            'scenarios': len(tasks),
+            'cached': len(cached_results),
+            'max_workers': max_workers,
+            'clip': clipper is not None,
+            'wall_s': time.perf_counter() - run_start,
+        }
+        write_report(report_file, report_records + run_profiler.records, run_info)
+        print(f"运行报告已保存至：{report_file}")
+
+    if store_dir and not output_file:
+        print(f"\n处理完成！中间数据已保存至：{store_dir}")
+        return f"处理完成！中间数据已保存至：{store_dir}"
+    print(f"\n处理完成！输出文件已保存至：{output_file}")
+    return f"处理完成！输出文件已保存至：{output_file}"
+
+
+def _merge_overflow_sheets(sheets, overflow_sheets):
+    """将因超过行数上限而拆分的工作表合并回原方案
+
+    overflow_sheets 为写入时记录的 {拆分工作表名称: 原方案工作表名称}（见 ZonesStore.read_overflow_sheets），
+    只有其中记录的、紧随原方案之后的工作表才会合并，名称相似的独立方案不受影响。
+    """
+    pending_name, pending_parts = None, []
+    for sheet_name, df in sheets:
+        if pending_name is not None and overflow_sheets.get(sheet_name) == pending_name:
+            pending_parts.append(df)
+        else:
+            if pending_name is not None:
+                yield pending_name, pd.concat(pending_parts, ignore_index=True) if len(pending_parts) > 1 else pending_parts[0]
+            pending_name, pending_parts = sheet_name, [df]
+    if pending_name is not None:
+        yield pending_name, pd.concat(pending_parts, ignore_index=True) if len(pending_parts) > 1 else pending_parts[0]
+
+
+def _analysis_columns(stats_config):
+    """分析统计需要读取的列：基本列加上统计配置中各指标的列"""
+    return ANALYSIS_COLUMNS + [col for col in metric_columns(stats_config) if col not in ANALYSIS_COLUMNS]
+
+
+def _parse_analysis_sheet(excel_file, sheet_name, columns=ANALYSIS_COLUMNS):
+    """从已打开的Excel文件中读取一个工作表的分析所需列"""
+    return excel_file.parse(sheet_name, usecols=lambda col: col in columns)
+
+
+def _init_excel_worker(input_excel, columns=ANALYSIS_COLUMNS):
+    """读取进程池初始化函数：每个工作进程只打开一次Excel文件"""
+    global _worker_excel_file, _worker_excel_columns
+    _worker_excel_file = pd.ExcelFile(input_excel, engine=_EXCEL_READ_ENGINE)
+    _worker_excel_columns = columns
+
+
+def _parse_analysis_sheet_in_worker(sheet_name):
+    return sheet_name, _parse_analysis_sheet(_worker_excel_file, sheet_name, _worker_excel_columns)
+
+
+def _iter_excel_sheets(input_excel, max_workers=1, columns=ANALYSIS_COLUMNS):
+    """只解析一次工作簿，按工作表顺序产出 (工作表名称, 分析所需列的DataFrame)
+
+    max_workers 大于1时将各工作表分配到进程池中解析，每个进程只打开一次文件。
+    """
+    with pd.ExcelFile(input_excel, engine=_EXCEL_READ_ENGINE) as excel_file:
+        sheet_names = excel_file.sheet_names
+        if max_workers is None or max_workers < 1:
+            max_workers = os.cpu_count() or 1
+        max_workers = min(max_workers, len(sheet_names))
+        if max_workers <= 1:
+            for sheet_name in sheet_names:
+                yield sheet_name, _parse_analysis_sheet(excel_file, sheet_name, columns)
+            return
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_excel_worker,
+                             initargs=(input_excel, columns)) as executor:
+        yield from executor.map(_parse_analysis_sheet_in_worker, sheet_names)
+
+
+def _collect_statistics(scenario_stats, sheet_name, df, stats_config):
+    """统计单个方案并追加到 scenario_stats，缺少必需的列时跳过"""
+    # 检查必需的列是否存在
+    if '淹没水深(m)' not in df.columns or '淹没面积(km2)' not in df.columns:
+        print(f"工作表 {sheet_name} 缺少必需的列")
+        return
+    
+    # 分级面积和最大值在一次向量化统计中得到
+    scenario_stats.append((sheet_name, scenario_statistics(df, stats_config)))
+
+
+def _write_analysis_table(scenario_stats, output_excel, project_object, stats_config):
+    """由各方案的统计结果生成分析结果表并写入Excel，同时写入多指标分级表和指标汇总表"""
+    # 创建新的Excel写入对象
+    writer = pd.ExcelWriter(output_excel, engine='openpyxl')
+    
+    # 一次性构建分析结果表
+    analysis_df = build_analysis_table(scenario_stats, project_object)
+    if analysis_df is not None:
+        # 将所有数据写入一个sheet
+        analysis_df.to_excel(writer, sheet_name='分析结果', index=False)
+        
+        print("成功生成分析表格，所有方案数据已合并到一个sheet中")
+    else:
+        # 如果没有数据，创建一个默认的工作表
+        default_df = pd.DataFrame({'提示': ['未找到有效的分析数据']})
+        default_df.to_excel(writer, sheet_name='分析结果', index=False)
+        print("未找到有效的分析数据")
+    
+    # 多指标分级面积、面积加权平均值和百分位数
+    levels_df, summary_df = build_metric_tables(scenario_stats, project_object, stats_config['percentiles'])
+    if levels_df is not None:
+        levels_df.to_excel(writer, sheet_name='分级统计', index=False)
+        summary_df.to_excel(writer, sheet_name='指标汇总', index=False)
+    
+    # 保存并关闭Excel文件
+    writer.close()
+
+
+def _profiled_sheets(sheets, profile, trace_memory):
+    """逐个产出 (工作表名称, DataFrame, 性能记录器)，取得每个工作表的耗时记为 read 阶段"""
+    iterator = iter(sheets)
+    while True:
+        profiler = StageProfiler('', profile, trace_memory)
+        with profiler.stage('read') as record:
+            item = next(iterator, None)
+        if item is None:
+            return
+        sheet_name, df = item
+        profiler.scenario = record['scenario'] = sheet_name
+        record['rows'] = len(df)
+        yield sheet_name, df, profiler
+
+
+def generate_analysis_table(input_excel, output_excel, project_object, max_workers=1, progress=None,
+                            cancel_event=None, raise_errors=False, stats_config=None, report_file=None,
+                            trace_memory=False):
+    """生成分析统计表格，所有方案放在一个sheet中，并输出最大淹没水深和最大淹没历时对应的element_no
+
+    input_excel 可以是提取结果Excel文件，也可以是列式中间数据目录。
+    max_workers 大于1时用多个进程并行解析Excel中的工作表。
+    progress 和 cancel_event 的含义与 extract_shp_to_excel 相同。
+    raise_errors 为True时出错直接抛出异常，否则返回错误信息。
+    stats_config 为多指标统计配置（配置字典或配置文件路径，见 ZonesStats.load_stats_config），
+    为None时使用默认配置；分级统计和指标汇总写入单独的工作表。
+    report_file 和 trace_memory 的含义与 extract_shp_to_excel 相同，read 阶段为主进程
+    取得每个工作表所用的时间（并行解析时为等待时间）。
+    """
+    run_start = time.perf_counter()
+    profile = bool(report_file)
+    report_records = []
+    try:
+        stats_config = load_stats_config(stats_config)
+        columns = _analysis_columns(stats_config)
+        if is_scenario_store(input_excel):
+            # 直接读取列式中间数据，只加载分析所需的列
+            sheets = iter_scenarios(input_excel, columns=columns)
+        else:
+            # 读取Excel文件：工作簿只打开一次，只保留分析所需的列
+            sheets = _merge_overflow_sheets(_iter_excel_sheets(input_excel, max_workers, columns),
+                                            read_overflow_sheets(input_excel))
+        
+        # 用于存储所有方案的统计结果
+        scenario_stats = []
+        
+        # 遍历每个工作表
+        for sheet_name, df, profiler in _profiled_sheets(sheets, profile, trace_memory):
+            _check_cancelled(cancel_event)
+            _emit(progress, 'sheet_loaded', name=sheet_name, rows=len(df))
+            with profiler.stage('statistics') as record:
+                _collect_statistics(scenario_stats, sheet_name, df, stats_config)
+                record['rows'] = len(df)
+            report_records.extend(profiler.records)
+        
+        run_profiler = StageProfiler('', profile, trace_memory)
+        with run_profiler.stage('write_analysis'):
+            _write_analysis_table(scenario_stats, output_excel, project_object, stats_config)
+        
+        if report_file:
+            run_info = {
+                'function': 'generate_analysis_table',
+                'input': str(input_excel),
+                'scenarios': len(scenario_stats),
+                'max_workers': max_workers,
+                'wall_s': time.perf_counter() - run_start,
+            }
+            write_report(report_file, report_records + run_profiler.records, run_info)
+            print(f"运行报告已保存至：{report_file}")
+        print(f"\n分析表格生成完成！输出文件已保存至：{output_excel}")
+        return f"分析表格生成完成！输出文件已保存至：{output_excel}"
+        
+    except JobCancelled:
+        raise
+    except Exception as e:
+        error_msg = f"生成分析表格时发生错误: {str(e)}"
+        print(error_msg)
+        if raise_errors:
+            raise
+        return error_msg
+
+
+# 包络统计所需的原始列
+ENVELOPE_COLUMNS = ['element_no', 'DEPTH2D', 'T_INUDATIO', 'T_FLOOD_DU']
+
+# 包络图层的字段：(包络指标, 数值字段名, 来源方案字段名)，字段名不超过10个字符以兼容SHP
+ENVELOPE_LAYER_FIELDS = [
+    ('depth', 'DEPTH2D', 'DEPTH_SCN'),
+    ('arrival', 'T_INUDATIO', 'INUDA_SCN'),
+    ('duration', 'T_FLOOD_DU', 'FLOOD_SCN'),
+]
+
+# 写出包络图层时每批读取的网格单元数
+ENVELOPE_BATCH_SIZE = 200000
+
+
+def _iter_envelope_sources(source, max_workers=1):
+    """按方案产出 (方案名称, 包络所需列的DataFrame)，source 为2D Zones主文件夹、中间数据目录或提取结果Excel"""
+    if is_scenario_store(source):
+        yield from iter_scenarios(source, columns=ENVELOPE_COLUMNS)
+    elif os.path.isdir(source):
+        tasks, warnings = _collect_tasks(source)
+        for warning in warnings:
+            print(warning)
+        for sheet_name, label, shp_path, _ in tasks:
+            # 只读取属性列，不读取几何
+            logs = []
+            df = _read_zones(shp_path, label, logs, columns=ENVELOPE_COLUMNS, ignore_geometry=True,
+                             **_ARROW_READ_KWARGS)
+            yield sheet_name, df
+    else:
+        yield from _merge_overflow_sheets(_iter_excel_sheets(source, max_workers, ENVELOPE_COLUMNS),
+                                          read_overflow_sheets(source))
+
+
+def _envelope_mesh_file(source):
+    """未指定网格文件时，使用2D Zones主文件夹中第一个方案的SHP文件提供单元几何"""
+    if os.path.isdir(source) and not is_scenario_store(source):
+        tasks, _ = _collect_tasks(source)
+        if tasks:
+            return tasks[0][2]
+    raise ValueError("由中间数据或Excel生成包络图层时需要指定包含element_no字段的网格SHP文件")
+
+
+def _write_envelope_layer(envelope, mesh_shp_file, output_file, batch_size):
+    """分批读取网格单元几何，按element_no连接包络值后追加写入图层，返回写出的单元数
+
+    第一批以覆盖方式写入，之后各批追加，内存占用只与 batch_size 有关。
+    """
+
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    total = pyogrio.read_info(mesh_shp_file)['features']
+    written = 0
+    for offset in range(0, max(total, 1), batch_size):
+        logs = []
+        mesh = _read_zones(mesh_shp_file, '网格文件', logs, columns=['element_no'], skip_features=offset,
+                           max_features=batch_size)
+        if mesh.empty:
+            break
+        values = envelope.lookup(mesh['element_no'].to_numpy())
+        for field, value_name, scenario_name in ENVELOPE_LAYER_FIELDS:
+            mesh[value_name] = values[field]
+            # 没有来源方案的单元写为空值
+            mesh[scenario_name] = pd.array(values[field + '_scenario'], dtype='string')
+        mesh.to_file(output_file, mode='a' if written else 'w', encoding='utf-8')
+        written += len(mesh)
+    return written
+
+
+def generate_envelope_layer(source, output_file, mesh_shp_file=None, work_dir=None, max_workers=1,
+                            batch_size=ENVELOPE_BATCH_SIZE, progress=None, cancel_event=None, raise_errors=False):
+    """生成跨方案包络图层：逐单元取各方案中的最大淹没水深、最早洪水到达时间和最长淹没历时，
+    并记录各值来自哪个方案
+
+    source 可以是2D Zones主文件夹、列式中间数据目录或提取结果Excel文件，各方案逐个读取并
+    并入按element_no索引的内存映射数组（见 ZonesEnvelope.ScenarioEnvelope），内存占用与
+    方案数量无关；work_dir 为数组文件所在文件夹，为空时使用临时文件夹。
+    结果按element_no连接到 mesh_shp_file 的单元几何后写为新图层（SHP、GPKG等，由扩展名决定），
+    source 为主文件夹时 mesh_shp_file 默认使用第一个方案的2D Zones.shp。
+    progress、cancel_event 和 raise_errors 的含义与 generate_analysis_table 相同。
+    """
+    try:
+        mesh_shp_file = mesh_shp_file or _envelope_mesh_file(source)
+        with ScenarioEnvelope(work_dir) as envelope:
+            for sheet_name, df in _iter_envelope_sources(source, max_workers):
+                _check_cancelled(cancel_event)
+                if 'element_no' not in df.columns:
+                    print(f"方案 {sheet_name} 缺少element_no列，已跳过")
+                    continue
+                envelope.add_scenario(sheet_name, df['element_no'].to_numpy(),
+                                      *(df[col].to_numpy() if col in df.columns else None
+                                        for col in ENVELOPE_COLUMNS[1:]))
+                _emit(progress, 'sheet_loaded', name=sheet_name, rows=len(df))
+                print(f"已并入方案 {sheet_name}（{len(df)} 个单元）")
+
+            if not envelope.scenario_names:
+                raise ValueError(f"在 {source} 中未找到任何方案数据")
+            _check_cancelled(cancel_event)
+            written = _write_envelope_layer(envelope, mesh_shp_file, output_file, batch_size)
+
+        print(f"\n包络图层生成完成！共 {len(envelope.scenario_names)} 个方案、{written} 个单元，"
+              f"输出文件已保存至：{output_file}")
+        return f"包络图层生成完成！输出文件已保存至：{output_file}"
+
+    except JobCancelled:
+        raise
+    except Exception as e:
+        error_msg = f"生成包络图层时发生错误: {str(e)}"
+        print(error_msg)
+        if raise_errors:
+            raise
+        return error_msg
+
+
+def rasterize_zones(main_folder, output_folder, cell_size, fields=None, tile_size=DEFAULT_TILE_SIZE, max_workers=1,
+                    progress=None, cancel_event=None, raise_errors=False):
+    """将各方案的2D Zones单元面栅格化为分块压缩、带概视图的GeoTIFF，供制图直接读取
+
+    每个方案的每个字段输出一个 <方案名称>_<字段>.tif，fields 默认为 DEPTH2D、T_INUDATIO、
+    T_FLOOD_DU（取原始值，没有单元覆盖的像元为无数据）；cell_size 为像元边长，单位与
+    2D Zones的坐标系相同。各方案按 tile_size 像元的瓦片处理，用空间索引找出与瓦片相交的
+    单元后栅格化；max_workers 大于1时各瓦片在进程池中并行处理（见 ZonesRaster）。
+    需要安装 rasterio。progress、cancel_event 和 raise_errors 的含义与 generate_analysis_table
+    相同，取消在瓦片之间生效。
+    """
+    fields = list(fields or RASTER_FIELDS)
+    try:
+        if cell_size is None or cell_size <= 0:
+            raise ValueError("像元大小必须大于0")
+        os.makedirs(output_folder, exist_ok=True)
+        tasks, warnings = _collect_tasks(main_folder)
+        for warning in warnings:
+            print(warning)
+        _emit(progress, 'scenarios_found', total=len(tasks), cached=0)
+
+        written = 0
+        for index, (sheet_name, label, shp_path, _) in enumerate(tasks):
+            _check_cancelled(cancel_event)
+            _emit(progress, 'scenario_started', name=sheet_name, index=index, total=len(tasks))
+            start = time.perf_counter()
+            try:
+                encoding = resolve_shp_encoding(shp_path)
+                available = set(pyogrio.read_info(shp_path, encoding=encoding)['fields'])
+                scenario_fields = [field for field in fields if field in available]
+                if not scenario_fields:
+                    raise ValueError(f"未包含需要栅格化的字段：{', '.join(fields)}")
+                output_files = {field: os.path.join(output_folder, f"{_safe_file_name(sheet_name)}_{field}.tif")
+                                for field in scenario_fields}
+                width, height = rasterize_scenario(shp_path, encoding, output_files, cell_size, tile_size,
+                                                   max_workers, lambda done, total: _check_cancelled(cancel_event))
+            except JobCancelled:
+                raise
+            except Exception as e:
+                print(f"栅格化{label}时发生错误：{str(e)}")
+                _emit(progress, 'scenario_failed', name=sheet_name, index=index, total=len(tasks))
+                continue
+
+            written += 1
+            elapsed = time.perf_counter() - start
+            print(f"成功栅格化：{sheet_name}，{width}×{height} 像元，字段: {scenario_fields}，用时 {elapsed:.1f}s")
+            _emit(progress, 'scenario_done', name=sheet_name, index=index, total=len(tasks), rows=width * height,
+                  timings={'rasterize': elapsed})
+
+        if written == 0:
+            raise ValueError(f"在 {main_folder} 中未能栅格化任何方案")
+        print(f"\n栅格生成完成！共 {written} 个方案，输出文件已保存至：{output_folder}")
+        return f"栅格生成完成！输出文件已保存至：{output_folder}"
+
+    except JobCancelled:
+        raise
+    except Exception as e:
+        error_msg = f"生成栅格时发生错误: {str(e)}"
+        print(error_msg)
+        if raise_errors:
+            raise
+        return error_msg
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+# 包络各指标：(名称, 初始值, 比较方式)。最大淹没水深和最长淹没历时取最大值，最早到达时间取最小值
+ENVELOPE_FIELDS = [
+    ('depth', -np.inf, 'max'),
+    ('arrival', np.inf, 'min'),
+    ('duration', -np.inf, 'max'),
+]
+
+# 首次分配的单元容量，element_no 超出时按倍数扩容
+INITIAL_CAPACITY = 1 << 16
+
+
+def _reduce_duplicates(index, values, mode):
+    """同一方案中element_no重复时只保留最大（或最小）值，返回去重后的 (index, values)"""
+    order = np.argsort(values if mode == 'max' else -values, kind='stable')
+    index = index[order]
+    values = values[order]
+    unique_index, inverse = np.unique(index, return_inverse=True)
+    if len(unique_index) == len(index):
+        return index, values
+    # 排序后同一单元的最后一次出现即为极值，重复赋值时保留最后一次的位置
+    last_position = np.zeros(len(unique_index), dtype=np.int64)
+    last_position[inverse] = np.arange(len(index))
+    return index[last_position], values[last_position]
+
+
+class ScenarioEnvelope:
+    """跨方案包络：逐单元记录最大淹没水深、最早洪水到达时间和最长淹没历时及其来源方案
+
+    各指标按 element_no 直接索引存放在磁盘上的稠密内存映射数组中，方案逐个并入，
+    内存占用与方案数量无关。work_dir 为空时使用临时文件夹，close() 时删除。
+    """
+
+    def __init__(self, work_dir=None, initial_capacity=INITIAL_CAPACITY):
+        self._owns_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='zones_envelope_')
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.scenario_names = []
+        self.capacity = 0
+        self._arrays = {}
+        self._generation = 0
+        self._grow(initial_capacity)
+
+    def _new_array(self, name, dtype, fill):
+        path = os.path.join(self.work_dir, f"{name}.{self._generation}.dat")
+        array = np.memmap(path, dtype=dtype, mode='w+', shape=(self.capacity,))
+        array[:] = fill
+        return array
+
+    def _grow(self, capacity):
+        """扩容到至少 capacity 个单元，已有数据复制到新的数组"""
+        old_arrays, old_capacity = self._arrays, self.capacity
+        self._generation += 1
+        self.capacity = capacity
+        self._arrays = {}
+        for name, fill, _ in ENVELOPE_FIELDS:
+            self._arrays[name] = self._new_array(name, np.float64, fill)
+            self._arrays[name + '_scenario'] = self._new_array(name + '_scenario', np.int32, -1)
+        # 逐个释放旧数组的最后一个引用后再删除文件（Windows下不能删除仍在映射的文件）
+        for key in list(old_arrays):
+            array = old_arrays.pop(key)
+            self._arrays[key][:old_capacity] = array
+            path = array.filename
+            del array
+            os.remove(path)
+
+    def add_scenario(self, name, element_no, depth=None, arrival=None, duration=None):
+        """并入一个方案
+
+        element_no 为非负整数数组，其余为与之等长的数组（缺少的指标传None）。
+        洪水到达时间只统计淹没水深大于0且取值不小于0的单元。
+        """
+        element_no = np.asarray(element_no)
+        valid = ~np.isnan(element_no.astype(float))
+        if (element_no[valid] < 0).any():
+            raise ValueError(f"方案 {name} 中存在负的element_no")
+        index = element_no[valid].astype(np.int64)
+        if len(index) and index.max() >= self.capacity:
+            self._grow(max(int(index.max()) + 1, self.capacity * 2))
+
+        scenario = len(self.scenario_names)
+        self.scenario_names.append(name)
+        columns = {'depth': depth, 'arrival': arrival, 'duration': duration}
+        for field, _, mode in ENVELOPE_FIELDS:
+            values = columns[field]
+            if values is None:
+                continue
+            values = np.asarray(values, dtype=float)[valid]
+            keep = ~np.isnan(values)
+            if field == 'arrival':
+                keep &= values >= 0
+                if depth is not None:
+                    keep &= np.nan_to_num(np.asarray(depth, dtype=float)[valid]) > 0
+            target, values = _reduce_duplicates(index[keep], values[keep], mode)
+
+            current = self._arrays[field]
+            better = values > current[target] if mode == 'max' else values < current[target]
+            current[target[better]] = values[better]
+            self._arrays[field + '_scenario'][target[better]] = scenario
+
+    def lookup(self, element_no):
+        """取出指定单元的包络值，返回 {指标: 数组, 指标_scenario: 方案名称数组}
+
+        没有任何方案提供数据的单元取值为NaN，方案名称为None。
+        """
+        element_no = np.asarray(element_no, dtype=np.int64)
+        inside = (element_no >= 0) & (element_no < self.capacity)
+        index = np.where(inside, element_no, 0)
+        names = np.array(self.scenario_names + [None], dtype=object)
+
+        result = {}
+        for field, fill, _ in ENVELOPE_FIELDS:
+            values = np.where(inside, self._arrays[field][index], fill)
+            result[field] = np.where(np.isinf(values), np.nan, values)
+            scenario = np.where(inside, self._arrays[field + '_scenario'][index], -1)
+            result[field + '_scenario'] = names[scenario]
+        return result
+
+    def close(self):
+        """释放内存映射数组并删除数据文件"""
+        for key in list(self._arrays):
+            array = self._arrays.pop(key)
+            path = array.filename
+            del array
+            if os.path.exists(path):
+                os.remove(path)
+        if self._owns_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+# 清单文件名
+MANIFEST_NAME = 'manifest.json'
+
+# 提取结果格式版本，派生列的计算方式改变时递增以使旧缓存失效
+RESULT_VERSION = 1
+
+# 参与判断方案是否变化的Shapefile组成文件
+_SCENARIO_SIDECARS = ('.shp', '.dbf', '.shx')
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scenario_fingerprint(shp_path, previous=None):
+    """记录方案各组成文件的大小、修改时间和内容哈希
+
+    大小和修改时间都与上次记录相同的文件直接沿用上次的哈希，不再读取文件内容。
+    """
+    previous = previous or {}
+    fingerprint = {}
+    base = os.path.splitext(shp_path)[0]
+    for ext in _SCENARIO_SIDECARS:
+        path = base + ext
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        old = previous.get(ext)
+        if old and old['size'] == entry['size'] and old['mtime'] == entry['mtime']:
+            entry['hash'] = old['hash']
+        else:
+            entry['hash'] = _file_hash(path)
+        fingerprint[ext] = entry
+    return fingerprint
+
+
+def _same_content(a, b):
+    """两次记录的组成文件及其内容哈希是否一致（只修改时间变化视为未变化）"""
+    return a.keys() == b.keys() and all(a[ext]['hash'] == b[ext]['hash'] for ext in a)
+
+
+class ScenarioManifest:
+    """增量提取清单
+
+    为每个方案记录组成文件的指纹、处理时使用的裁剪设置以及缓存的提取结果，
+    再次运行时只有文件内容或设置发生变化的方案需要重新处理。
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = {}
+        self._fingerprints = {}
+        manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == RESULT_VERSION:
+                    self.entries = manifest.get('scenarios', {})
+            except (OSError, ValueError) as e:
+                print(f"读取增量提取清单失败，将全部重新处理：{str(e)}")
+
+    def lookup(self, sheet_name, shp_path, settings):
+        """方案未变化时返回缓存的提取结果，否则返回None"""
+        entry = self.entries.get(sheet_name)
+        fingerprint = scenario_fingerprint(shp_path, entry['files'] if entry else None)
+        self._fingerprints[sheet_name] = fingerprint
+        if not entry or entry['settings'] != settings or not _same_content(entry['files'], fingerprint):
+            return None
+        # 裁剪后的shp文件被删除时也需要重新处理
+        if entry.get('clipped_shp') and not os.path.exists(entry['clipped_shp']):
+            return None
+
+        result = {'sheet_name': sheet_name, 'data': None, 'columns': entry['columns'], 'logs': []}
+        if entry['result_file']:
+            result_path = os.path.join(self.cache_dir, entry['result_file'])
+            if not os.path.exists(result_path):
+                return None
+            result['data'] = pd.read_pickle(result_path)
+        # 更新修改时间等信息，下次无需重新计算哈希
+        entry['files'] = fingerprint
+        return result
+
+    def store(self, sheet_name, settings, result, clipped_shp=None):
+        """记录方案新的处理结果"""
+        old = self.entries.get(sheet_name)
+        result_file = old['result_file'] if old and old['result_file'] else None
+        if result['data'] is not None:
+            if result_file is None:
+                result_file = f"{hashlib.sha1(sheet_name.encode('utf-8')).hexdigest()}.pkl"
+            result['data'].to_pickle(os.path.join(self.cache_dir, result_file))
+        elif result_file:
+            os.remove(os.path.join(self.cache_dir, result_file))
+            result_file = None
+
+        self.entries[sheet_name] = {
+            'files': self._fingerprints[sheet_name],
+            'settings': settings,
+            'columns': result['columns'],
+            'result_file': result_file,
+            'clipped_shp': clipped_shp,
+        }
+
+    def save(self, sheet_names):
+        """保存清单，并删除已不存在的方案的缓存"""
+        for sheet_name in list(self.entries):
+            if sheet_name in sheet_names:
+                continue
+            result_file = self.entries.pop(sheet_name)['result_file']
+            if result_file and os.path.exists(os.path.join(self.cache_dir, result_file)):
+                os.remove(os.path.join(self.cache_dir, result_file))
+
+        manifest = {'version': RESULT_VERSION, 'scenarios': self.entries}
+        with open(os.path.join(self.cache_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
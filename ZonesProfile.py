@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import shapely
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# 运行报告中每条记录的字段，CSV按此顺序输出
+REPORT_FIELDS = ['scenario', 'stage', 'wall_s', 'cpu_s', 'rows', 'vertices', 'peak_alloc_mb', 'peak_rss_mb', 'pid']
+
+_MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    """当前进程到目前为止的内存峰值（MB），无法获取时返回None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux下单位为KB，macOS下为字节
+        return peak / _MB if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / _MB
+    return None
+
+
+def count_vertices(geometries):
+    """几何数组的顶点总数"""
+    return int(shapely.get_num_coordinates(geometries).sum())
+
+
+class StageProfiler:
+    """分阶段记录处理耗时
+
+    始终记录各阶段的墙钟时间；enabled 为True时还记录CPU时间和进程内存峰值，
+    trace_memory 为True时用 tracemalloc 记录阶段内Python及numpy的内存分配峰值
+    （开销较大，仅在排查内存问题时打开）。
+    """
+
+    def __init__(self, scenario='', enabled=False, trace_memory=False):
+        self.scenario = scenario
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.records = []
+
+    @contextmanager
+    def stage(self, name):
+        """记录一个阶段，with 块内可向产出的记录中填写 rows、vertices 等计数"""
+        record = {'scenario': self.scenario, 'stage': name}
+        started_tracing = False
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_start
+            if self.enabled:
+                record['cpu_s'] = time.process_time() - cpu_start
+                record['peak_rss_mb'] = peak_rss_mb()
+                record['pid'] = os.getpid()
+            if self.trace_memory:
+                record['peak_alloc_mb'] = tracemalloc.get_traced_memory()[1] / _MB
+                if started_tracing:
+                    tracemalloc.stop()
+            self.records.append(record)
+
+    def timings(self):
+        """各阶段的墙钟时间字典"""
+        return {record['stage']: record['wall_s'] for record in self.records}
+
+
+def write_report(report_file, records, run_info=None):
+    """将运行记录写为JSON或CSV报告（由扩展名决定），JSON中同时包含运行信息"""
+    directory = os.path.dirname(report_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if os.path.splitext(report_file)[1].lower() == '.csv':
+        with open(report_file, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        report = {'run': run_info or {}, 'records': [{field: record.get(field) for field in REPORT_FIELDS}
+                                                     for record in records]}
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
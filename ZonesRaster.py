@@ -0,0 +1,197 @@
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pyogrio
+import shapely
+
+try:
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.features import rasterize
+    from rasterio.transform import from_origin
+    from rasterio.windows import Window
+except ImportError:
+    rasterio = None
+
+
+# 默认栅格化的字段
+RASTER_FIELDS = ['DEPTH2D', 'T_INUDATIO', 'T_FLOOD_DU']
+
+# 无数据值
+NODATA = -9999.0
+
+# GeoTIFF内部分块大小，以及每个处理瓦片的默认边长（像元数，应为分块大小的整数倍）
+BLOCK_SIZE = 256
+DEFAULT_TILE_SIZE = 1024
+
+# 栅格写出参数：分块存储、DEFLATE压缩（浮点预测），全为无数据的分块不写入
+GTIFF_PROFILE = {
+    'driver': 'GTiff',
+    'dtype': 'float32',
+    'nodata': NODATA,
+    'tiled': True,
+    'blockxsize': BLOCK_SIZE,
+    'blockysize': BLOCK_SIZE,
+    'compress': 'deflate',
+    'predictor': 3,
+    'sparse_ok': True,
+    'bigtiff': 'if_safer',
+}
+
+# 工作进程中当前方案的瓦片栅格化器，由进程池初始化函数设置
+_worker_rasterizer = None
+
+
+def _require_rasterio():
+    if rasterio is None:
+        raise ImportError("生成栅格需要安装 rasterio")
+
+
+def raster_grid(bounds, cell_size):
+    """覆盖 bounds 的栅格网格，原点对齐到 cell_size 的整数倍，返回 (仿射变换, 宽, 高)"""
+    xmin, ymin, xmax, ymax = bounds
+    left = math.floor(xmin / cell_size) * cell_size
+    top = math.ceil(ymax / cell_size) * cell_size
+    width = max(1, math.ceil((xmax - left) / cell_size))
+    height = max(1, math.ceil((top - ymin) / cell_size))
+    return from_origin(left, top, cell_size, cell_size), width, height
+
+
+def overview_factors(width, height, block_size=BLOCK_SIZE):
+    """逐级缩小一半，直到概视图的长边不超过一个分块"""
+    factors = []
+    factor = 2
+    while max(width, height) / factor >= block_size:
+        factors.append(factor)
+        factor *= 2
+    return factors or [2]
+
+
+class TileRasterizer:
+    """按瓦片将单元面栅格化：用STRtree找出与瓦片相交的单元，只对这些单元烧录
+
+    每个瓦片只栅格化一次单元序号，各字段的值再按序号取出，像元取其中心所在单元的值。
+    """
+
+    def __init__(self, geometries, values, transform):
+        self.geometries = np.asarray(geometries)
+        self.tree = shapely.STRtree(self.geometries)
+        self.values = {field: np.asarray(column, dtype='float32') for field, column in values.items()}
+        self.transform = transform
+
+    @classmethod
+    def from_file(cls, shp_path, encoding, fields, transform):
+        gdf = gpd.read_file(shp_path, encoding=encoding, columns=fields)
+        values = {field: gdf[field].to_numpy(dtype=float) for field in fields}
+        return cls(gdf.geometry.values, values, transform)
+
+    def tile(self, window):
+        """栅格化一个瓦片，返回 (window, {字段: 数组})，瓦片内没有单元时返回 (window, None)"""
+        row_off, col_off, height, width = window
+        transform = self.transform * self.transform.translation(col_off, row_off)
+        left, top = transform * (0, 0)
+        right, bottom = transform * (width, height)
+        candidates = self.tree.query(shapely.box(left, bottom, right, top), predicate='intersects')
+        if len(candidates) == 0:
+            return window, None
+
+        # 单元序号从1开始，0表示没有单元覆盖
+        index = rasterize(zip(self.geometries[candidates], (candidates + 1).tolist()), out_shape=(height, width),
+                          transform=transform, fill=0, dtype='int32')
+        covered = index > 0
+        if not covered.any():
+            return window, None
+        bands = {}
+        for field, column in self.values.items():
+            band = np.full((height, width), NODATA, dtype='float32')
+            band[covered] = column[index[covered] - 1]
+            band[np.isnan(band)] = NODATA
+            bands[field] = band
+        return window, bands
+
+
+def _init_raster_worker(shp_path, encoding, fields, transform):
+    """栅格化进程池初始化函数：每个工作进程只读取一次方案的几何并建立空间索引"""
+    global _worker_rasterizer
+    _worker_rasterizer = TileRasterizer.from_file(shp_path, encoding, fields, transform)
+
+
+def _rasterize_tile_in_worker(window):
+    return _worker_rasterizer.tile(window)
+
+
+def _iter_windows(width, height, tile_size):
+    for row_off in range(0, height, tile_size):
+        for col_off in range(0, width, tile_size):
+            yield row_off, col_off, min(tile_size, height - row_off), min(tile_size, width - col_off)
+
+
+def _iter_tiles(windows, shp_path, encoding, fields, transform, max_workers):
+    """按顺序产出各瓦片的栅格化结果，max_workers大于1时在进程池中并行处理"""
+    if max_workers <= 1:
+        rasterizer = TileRasterizer.from_file(shp_path, encoding, fields, transform)
+        for window in windows:
+            yield rasterizer.tile(window)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_raster_worker,
+                                   initargs=(shp_path, encoding, fields, transform))
+    try:
+        # 同时提交的瓦片数不超过进程数的两倍，主进程写出较慢时结果不会堆积
+        pending = deque(executor.submit(_rasterize_tile_in_worker, window) for window in windows[:2 * max_workers])
+        next_index = len(pending)
+        while pending:
+            result = pending.popleft().result()
+            if next_index < len(windows):
+                pending.append(executor.submit(_rasterize_tile_in_worker, windows[next_index]))
+                next_index += 1
+            yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def rasterize_scenario(shp_path, encoding, output_files, cell_size, tile_size=DEFAULT_TILE_SIZE, max_workers=1,
+                       tile_done=None):
+    """将一个方案的2D Zones单元面栅格化为分块压缩的GeoTIFF，并生成概视图
+
+    output_files 为 {字段: 输出文件路径}；tile_done(已完成瓦片数, 瓦片总数) 在每个瓦片
+    写出后调用，可在其中抛出异常以中止处理。返回 (宽, 高)。
+    """
+    _require_rasterio()
+    if tile_size % BLOCK_SIZE:
+        raise ValueError(f"瓦片边长必须是 {BLOCK_SIZE} 的整数倍")
+    info = pyogrio.read_info(shp_path, encoding=encoding)
+    transform, width, height = raster_grid(info['total_bounds'], cell_size)
+    windows = list(_iter_windows(width, height, tile_size))
+    max_workers = min(max_workers or os.cpu_count() or 1, len(windows))
+
+    profile = dict(GTIFF_PROFILE, width=width, height=height, count=1, crs=info['crs'], transform=transform)
+    datasets = {}
+    try:
+        for field, path in output_files.items():
+            datasets[field] = rasterio.open(path, 'w', **profile)
+            datasets[field].set_band_description(1, field)
+        tiles = _iter_tiles(windows, shp_path, encoding, list(output_files), transform, max_workers)
+        try:
+            for done, (window, bands) in enumerate(tiles, start=1):
+                if bands is not None:
+                    row_off, col_off, tile_height, tile_width = window
+                    for field, band in bands.items():
+                        datasets[field].write(band, 1, window=Window(col_off, row_off, tile_width, tile_height))
+                if tile_done is not None:
+                    tile_done(done, len(windows))
+        finally:
+            tiles.close()
+
+        factors = overview_factors(width, height)
+        for dataset in datasets.values():
+            dataset.build_overviews(factors, Resampling.nearest)
+            dataset.update_tags(ns='rio_overview', resampling='nearest')
+    finally:
+        for dataset in datasets.values():
+            dataset.close()
+    return width, height
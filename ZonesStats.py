@@ -0,0 +1,252 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+# 淹没水深分级的分界值（m）及各级名称，区间左闭右开
+DEPTH_BREAKS = [0.5, 1.0, 2.0, 3.0]
+DEPTH_LABELS = ["<0.5m", "0.5~1.0m", "1.0~2.0m", "2.0~3.0m", ">3.0m"]
+
+# 默认的多指标统计配置，可由JSON或TOML配置文件替换，格式相同：
+# percentiles 为面积加权百分位数；metrics 中每项为一个指标，column 为数据列，
+# breaks 为递增的分级界限（区间左闭右开），divisor 为换算除数（如秒换算为小时填3600），
+# flooded_only 为True时只统计淹没水深大于0的单元，labels 可自定义各级名称。
+DEFAULT_STATS_CONFIG = {
+    'percentiles': [50, 90, 99],
+    'metrics': [
+        {'name': '淹没水深', 'column': '淹没水深(m)', 'unit': 'm', 'breaks': DEPTH_BREAKS},
+        {'name': '洪水到达时间', 'column': '洪水到达时间(h)', 'unit': 'h', 'breaks': [1, 3, 6, 12, 24],
+         'flooded_only': True},
+        {'name': '淹没历时', 'column': '淹没历时(h)', 'unit': 'h', 'breaks': [6, 12, 24, 48, 72],
+         'flooded_only': True},
+        {'name': '洪峰时间', 'column': 'T_PEAK_2D', 'unit': 'h', 'divisor': 3600, 'breaks': [1, 3, 6, 12, 24],
+         'flooded_only': True},
+    ],
+}
+
+
+def _default_labels(breaks, unit):
+    bounds = [f"{value:.1f}" for value in breaks]
+    return ([f"<{bounds[0]}{unit}"]
+            + [f"{low}~{high}{unit}" for low, high in zip(bounds, bounds[1:])]
+            + [f">{bounds[-1]}{unit}"])
+
+
+def load_stats_config(config=None):
+    """读取并检查多指标统计配置
+
+    config 可以是None（使用默认配置）、配置字典或JSON/TOML配置文件路径。
+    配置有误时抛出ValueError。
+    """
+    if config is None:
+        config = DEFAULT_STATS_CONFIG
+    elif isinstance(config, (str, os.PathLike)):
+        path = os.fspath(config)
+        if path.lower().endswith('.toml'):
+            if tomllib is None:
+                raise ValueError("读取TOML配置文件需要 Python 3.11 及以上版本或安装 tomli")
+            with open(path, 'rb') as f:
+                config = tomllib.load(f)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+
+    config = copy.deepcopy(config)
+    config.setdefault('percentiles', DEFAULT_STATS_CONFIG['percentiles'])
+    if any(not 0 <= p <= 100 for p in config['percentiles']):
+        raise ValueError("百分位数必须在0到100之间")
+
+    metrics = config.get('metrics')
+    if not metrics:
+        raise ValueError("统计配置中没有任何指标")
+    for metric in metrics:
+        if 'column' not in metric or not metric.get('breaks'):
+            raise ValueError(f"指标配置缺少 column 或 breaks：{metric}")
+        breaks = [float(value) for value in metric['breaks']]
+        if any(high <= low for low, high in zip(breaks, breaks[1:])):
+            raise ValueError(f"指标 {metric['column']} 的分级界限必须递增")
+        metric['breaks'] = breaks
+        metric.setdefault('name', metric['column'])
+        metric.setdefault('unit', '')
+        metric.setdefault('divisor', 1)
+        metric.setdefault('flooded_only', False)
+        if 'labels' in metric:
+            if len(metric['labels']) != len(breaks) + 1:
+                raise ValueError(f"指标 {metric['column']} 的分级名称数量应为分级界限数量加1")
+        else:
+            metric['labels'] = _default_labels(breaks, metric['unit'])
+    return config
+
+
+def metric_columns(config):
+    """统计配置中用到的数据列"""
+    return [metric['column'] for metric in config['metrics']]
+
+
+def _max_with_elements(values, df):
+    """返回最大值及取得最大值的所有element_no，没有有效数据时最大值为0"""
+    if len(values) == 0 or np.isnan(values).all():
+        return 0, None
+    max_value = np.nanmax(values)
+    if max_value <= 0:
+        return max_value, None
+    return max_value, df['element_no'].to_numpy()[values == max_value]
+
+
+def _weighted_percentiles(values, weights, percentiles):
+    """面积加权百分位数：累计面积首次达到指定比例时的取值"""
+    order = np.argsort(values, kind='stable')
+    cumulative = np.cumsum(weights[order])
+    if len(cumulative) == 0 or cumulative[-1] <= 0:
+        return np.full(len(percentiles), np.nan)
+    targets = np.asarray(percentiles, dtype=float) / 100 * cumulative[-1]
+    positions = np.minimum(np.searchsorted(cumulative, targets), len(order) - 1)
+    return values[order][positions]
+
+
+def _metric_statistics(df, metric, area, flooded, percentiles):
+    """单个指标的分级面积、面积加权平均值和百分位数，数据中没有该列时返回None"""
+    if metric['column'] not in df.columns:
+        return None
+    values = df[metric['column']].to_numpy(dtype=float) / metric['divisor']
+    valid = ~np.isnan(values)
+    if metric['flooded_only']:
+        valid &= flooded
+    values = values[valid]
+    weights = area[valid]
+
+    level_areas = np.bincount(np.digitize(values, metric['breaks']), weights=weights,
+                              minlength=len(metric['labels']))
+    total_area = weights.sum()
+    return {
+        'name': metric['name'],
+        'labels': metric['labels'],
+        'level_areas': level_areas,
+        'total_area': total_area,
+        'mean': (values * weights).sum() / total_area if total_area > 0 else np.nan,
+        'percentiles': _weighted_percentiles(values, weights, percentiles),
+    }
+
+
+def scenario_statistics(df, config=None):
+    """对单个方案做一次向量化统计
+
+    淹没水深只分级一次，各级面积由带权重的 bincount 求得；
+    同时求出最大淹没水深、最大淹没历时及其对应的element_no，以及统计配置
+    （见 load_stats_config，已检查的配置字典）中各指标的分级面积、面积加权平均值和百分位数。
+    """
+    config = config or load_stats_config()
+    depth = df['淹没水深(m)'].to_numpy(dtype=float)
+    area = np.nan_to_num(df['淹没面积(km2)'].to_numpy(dtype=float))
+
+    # 水深缺失的单元不计入任何分级，但计入总面积
+    valid = ~np.isnan(depth)
+    levels = np.digitize(depth[valid], DEPTH_BREAKS)
+    level_areas = np.bincount(levels, weights=area[valid], minlength=len(DEPTH_LABELS))
+
+    if '淹没历时(h)' in df.columns:
+        duration = df['淹没历时(h)'].to_numpy(dtype=float)
+    else:
+        duration = np.empty(0)
+
+    max_depth, max_depth_elements = _max_with_elements(depth, df)
+    max_duration, max_duration_elements = _max_with_elements(duration, df)
+
+    flooded = np.nan_to_num(depth) > 0
+    metrics = [_metric_statistics(df, metric, area, flooded, config['percentiles'])
+               for metric in config['metrics']]
+
+    return {
+        'total_area': area.sum(),
+        'level_areas': level_areas,
+        'max_depth': max_depth,
+        'max_depth_elements': max_depth_elements,
+        'max_duration': max_duration,
+        'max_duration_elements': max_duration_elements,
+        'metrics': [metric for metric in metrics if metric is not None],
+    }
+
+
+def _max_records(scenario_stats, project_object, key, label):
+    names, values, elements = [], [], []
+    for sheet_name, stats in scenario_stats:
+        found = stats[f'{key}_elements']
+        if found is None:
+            continue
+        names.extend([sheet_name] * len(found))
+        values.extend([stats[key]] * len(found))
+        elements.append(found)
+    if not names:
+        return None
+    return pd.DataFrame({
+        '编制对象': project_object,
+        '方案名称': names,
+        '最大值类型': label,
+        '最大值': values,
+        'element_no': np.concatenate(elements),
+    })
+
+
+def build_analysis_table(scenario_stats, project_object):
+    """由各方案的统计结果一次性构建分析结果表
+
+    scenario_stats 为 (方案名称, scenario_statistics结果) 列表。先列出所有方案的
+    水深分级，再列出最大淹没水深和最大淹没历时记录。没有数据时返回None。
+    """
+    if not scenario_stats:
+        return None
+
+    n_levels = len(DEPTH_LABELS)
+    level_areas = np.concatenate([stats['level_areas'] for _, stats in scenario_stats])
+    total_areas = np.repeat([stats['total_area'] for _, stats in scenario_stats], n_levels)
+    ratios = np.divide(level_areas, total_areas, out=np.zeros_like(level_areas), where=total_areas > 0)
+
+    levels_df = pd.DataFrame({
+        '编制对象': project_object,
+        '方案名称': np.repeat([sheet_name for sheet_name, _ in scenario_stats], n_levels),
+        '淹没水深(m)': DEPTH_LABELS * len(scenario_stats),
+        '淹没面积(km2)': level_areas.round(4),
+        '占比': [f"{ratio:.2%}" for ratio in ratios],
+    })
+
+    frames = [levels_df,
+              _max_records(scenario_stats, project_object, 'max_depth', '最大淹没水深'),
+              _max_records(scenario_stats, project_object, 'max_duration', '最大淹没历时')]
+    return pd.concat([frame for frame in frames if frame is not None], ignore_index=True)
+
+
+def build_metric_tables(scenario_stats, project_object, percentiles):
+    """由各方案的统计结果构建多指标分级表和指标汇总表，没有数据时返回 (None, None)"""
+    level_frames = []
+    summary_rows = []
+    for sheet_name, stats in scenario_stats:
+        for metric in stats.get('metrics', []):
+            total = metric['total_area']
+            ratios = metric['level_areas'] / total if total > 0 else np.zeros_like(metric['level_areas'])
+            level_frames.append(pd.DataFrame({
+                '编制对象': project_object,
+                '方案名称': sheet_name,
+                '指标': metric['name'],
+                '分级': metric['labels'],
+                '面积(km2)': metric['level_areas'].round(4),
+                '占比': [f"{ratio:.2%}" for ratio in ratios],
+            }))
+            row = {'编制对象': project_object, '方案名称': sheet_name, '指标': metric['name'],
+                   '统计面积(km2)': round(total, 4), '面积加权平均': metric['mean']}
+            row.update({f"P{p:g}": value for p, value in zip(percentiles, metric['percentiles'])})
+            summary_rows.append(row)
+
+    if not level_frames:
+        return None, None
+    return pd.concat(level_frames, ignore_index=True), pd.DataFrame(summary_rows)
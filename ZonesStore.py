@@ -0,0 +1,293 @@
+import json
+import os
+import zipfile
+from xml.etree import ElementTree
+
+from openpyxl import Workbook
+from openpyxl.packaging.custom import StringProperty
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# 方案目录文件，按写入顺序记录每个方案的名称、数据文件和行数
+MANIFEST_NAME = 'scenarios.json'
+
+# Excel单个工作表可容纳的数据行数（不含表头）
+MAX_SHEET_ROWS = 1048575
+
+# 记录拆分工作表的工作簿自定义属性名前缀：属性名为 前缀+拆分工作表名，值为原方案的工作表名
+OVERFLOW_PROPERTY_PREFIX = 'overflow_sheet:'
+
+# 流式写入Excel时每次转换的行数
+WRITE_CHUNK_ROWS = 10000
+
+# 支持的存储格式及对应的文件扩展名
+STORE_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# 裁剪后图层支持的输出格式及对应的文件扩展名
+CLIPPED_FORMATS = {'shp': '.shp', 'gpkg': '.gpkg', 'fgb': '.fgb'}
+
+# 输出为GeoPackage时，所有方案写入同一个文件
+CLIPPED_GPKG_NAME = 'Clipped_Zones.gpkg'
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("使用列式中间数据需要安装 pyarrow")
+
+
+def is_scenario_store(path):
+    """判断路径是否为列式中间数据目录"""
+    return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def read_manifest(store_dir):
+    with open(os.path.join(store_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class StreamingExcelWriter:
+    """流式Excel写入器：每个方案一个工作表，接口与 ScenarioStoreWriter 一致
+
+    使用openpyxl的只写模式，逐行写入的数据立即落到临时文件，内存占用与方案
+    数量和单元数量无关。超过Excel行数上限的方案自动拆分到 名称_2、名称_3 等工作表，
+    拆分出的工作表记录在工作簿的自定义属性中（见 read_overflow_sheets）。
+    reserved_names 为本次将要写入的全部方案名称，拆分工作表不会占用这些名称。
+    """
+
+    def __init__(self, output_file, reserved_names=()):
+        self.output_file = output_file
+        self.workbook = Workbook(write_only=True)
+        self.sheet_names = []
+        self.reserved_names = list(reserved_names)
+        # 拆分工作表名称 -> 原方案工作表名称
+        self.overflow_sheets = {}
+
+    def write(self, name, df):
+        self.write_chunks(name, [df])
+
+    def write_chunks(self, name, chunks):
+        """逐块写入一个方案，chunks 为列相同的DataFrame序列，返回写入的总行数
+
+        写满一个工作表后自动续写到下一个拆分工作表，结果与一次写入整个方案相同。
+        """
+        worksheet, columns, rows_in_sheet, parts, suffix, total = None, None, 0, 0, 0, 0
+        for df in chunks:
+            if worksheet is None:
+                columns = [str(column) for column in df.columns]
+                worksheet = self._new_sheet(name, columns)
+                parts = 1
+            start = 0
+            while start < len(df):
+                if rows_in_sheet == MAX_SHEET_ROWS:
+                    parts += 1
+                    suffix = self._free_suffix(name, max(suffix, parts))
+                    worksheet = self._new_sheet(f"{name}_{suffix}", columns)
+                    # 记录openpyxl实际使用的名称
+                    self.overflow_sheets[worksheet.title] = name
+                    rows_in_sheet = 0
+                stop = min(start + WRITE_CHUNK_ROWS, start + MAX_SHEET_ROWS - rows_in_sheet, len(df))
+                chunk = df.iloc[start:stop]
+                # 缺失值写为空单元格，与 DataFrame.to_excel 一致
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                for row in chunk.itertuples(index=False, name=None):
+                    worksheet.append(row)
+                rows_in_sheet += stop - start
+                start = stop
+            total += len(df)
+
+        if parts > 1:
+            print(f"工作表 {name} 超过Excel行数上限，已拆分为 {parts} 个工作表")
+        return total
+
+    def _free_suffix(self, name, suffix):
+        """从 suffix 开始找到第一个未被已写入工作表或待写入方案占用的拆分序号（工作表名称不区分大小写）"""
+        taken = {sheet.lower() for sheet in self.sheet_names + self.reserved_names}
+        while f"{name}_{suffix}".lower() in taken:
+            suffix += 1
+        return suffix
+
+    def _new_sheet(self, sheet_name, columns):
+        worksheet = self.workbook.create_sheet(title=sheet_name)
+        worksheet.append(columns)
+        self.sheet_names.append(worksheet.title)
+        return worksheet
+
+    def close(self):
+        for sheet_name, parent in self.overflow_sheets.items():
+            self.workbook.custom_doc_props.append(
+                StringProperty(name=OVERFLOW_PROPERTY_PREFIX + sheet_name, value=parent))
+        self.workbook.save(self.output_file)
+
+
+def read_overflow_sheets(excel_file):
+    """读取 StreamingExcelWriter 记录的拆分工作表，返回 {拆分工作表名称: 原方案工作表名称}
+
+    只读取工作簿中的自定义属性部分，不加载工作表内容；没有记录（如其他程序生成的文件）时返回空字典。
+    """
+    try:
+        with zipfile.ZipFile(excel_file) as archive:
+            if 'docProps/custom.xml' not in archive.namelist():
+                return {}
+            root = ElementTree.fromstring(archive.read('docProps/custom.xml'))
+    except zipfile.BadZipFile:
+        return {}
+    overflow = {}
+    for prop in root:
+        name = prop.get('name', '')
+        if name.startswith(OVERFLOW_PROPERTY_PREFIX) and len(prop):
+            overflow[name[len(OVERFLOW_PROPERTY_PREFIX):]] = prop[0].text or ''
+    return overflow
+
+
+class ScenarioStoreWriter:
+    """列式中间数据写入器：每个方案一个Parquet或Arrow IPC文件
+
+    方案目录文件 scenarios.json 保存方案顺序，读取时按此顺序还原，
+    与Excel中的工作表顺序一致。
+    """
+
+    def __init__(self, store_dir, store_format='parquet'):
+        _require_pyarrow()
+        if store_format not in STORE_FORMATS:
+            raise ValueError(f"不支持的存储格式：{store_format}")
+        self.store_dir = store_dir
+        self.store_format = store_format
+        self.scenarios = []
+        os.makedirs(store_dir, exist_ok=True)
+
+        # 清除上一次运行留下的数据文件
+        for name in os.listdir(store_dir):
+            if name == MANIFEST_NAME or (name.startswith('part-') and name.endswith(tuple(STORE_FORMATS.values()))):
+                os.remove(os.path.join(store_dir, name))
+
+    def write(self, name, df):
+        self.write_chunks(name, [df])
+
+    def write_chunks(self, name, chunks):
+        """逐块写入一个方案，chunks 为列相同的DataFrame序列，返回写入的总行数
+
+        各块依次追加到同一个数据文件（Parquet的一个行组或Arrow IPC的一个批次），
+        后续各块按第一块的表结构转换类型。
+        """
+        file_name = f"part-{len(self.scenarios):04d}{STORE_FORMATS[self.store_format]}"
+        path = os.path.join(self.store_dir, file_name)
+        file_writer, schema, total = None, None, 0
+        try:
+            for df in chunks:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if file_writer is None:
+                    schema = table.schema
+                    if self.store_format == 'parquet':
+                        file_writer = pq.ParquetWriter(path, schema)
+                    else:
+                        file_writer = pa.ipc.new_file(path, schema)
+                elif table.schema != schema:
+                    table = table.cast(schema)
+                file_writer.write_table(table)
+                total += len(df)
+        finally:
+            if file_writer is not None:
+                file_writer.close()
+        self.scenarios.append({'name': name, 'file': file_name, 'rows': total})
+        return total
+
+    def close(self):
+        manifest = {'format': self.store_format, 'scenarios': self.scenarios}
+        with open(os.path.join(self.store_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+class ClippedLayerWriter:
+    """裁剪后图层写入器
+
+    - shp：每个方案一个 <名称>_Clipped.shp（原有方式）
+    - gpkg：所有方案写入同一个GeoPackage，每个方案一个图层（图层名为方案名称），
+      带R树空间索引；同一文件不能并发写入，需由主进程按顺序写入
+    - fgb：每个方案一个带打包R树空间索引的FlatGeobuf文件
+
+    每次写入在一个事务中完成；安装了pyarrow时通过Arrow批量写入。
+    """
+
+    def __init__(self, output_dir, output_format='shp'):
+        if output_format not in CLIPPED_FORMATS:
+            raise ValueError(f"不支持的裁剪输出格式：{output_format}")
+        self.output_dir = str(output_dir)
+        self.output_format = output_format
+        self.single_file = output_format == 'gpkg'
+
+    def target(self, sheet_name, clipped_name):
+        """方案的输出位置 (文件路径, 图层名称)，每个方案一个文件时图层名称为None"""
+        if self.single_file:
+            return os.path.join(self.output_dir, CLIPPED_GPKG_NAME), sheet_name
+        file_name = os.path.splitext(clipped_name)[0] + CLIPPED_FORMATS[self.output_format]
+        return os.path.join(self.output_dir, file_name), None
+
+    def describe(self, sheet_name, clipped_name):
+        path, layer = self.target(sheet_name, clipped_name)
+        return path if layer is None else f"{path}（图层 {layer}）"
+
+    def write(self, gdf, sheet_name, clipped_name, append=False):
+        """写入一个方案，append 为True时追加到已写入的同一方案之后（分批处理）"""
+        path, layer = self.target(sheet_name, clipped_name)
+        kwargs = {'mode': 'a' if append else 'w'}
+        if layer is not None:
+            kwargs['layer'] = layer
+        if self.output_format == 'fgb':
+            kwargs['SPATIAL_INDEX'] = 'YES'
+        if pa is not None:
+            kwargs['use_arrow'] = True
+        gdf.to_file(path, **kwargs)
+
+
+def list_scenarios(store_dir):
+    """按写入顺序返回方案名称列表"""
+    return [entry['name'] for entry in read_manifest(store_dir)['scenarios']]
+
+
+def _read_table(path, columns):
+    """以内存映射方式读取单个方案文件，只读取存在的指定列"""
+    if path.endswith('.parquet'):
+        if columns is not None:
+            available = pq.read_schema(path, memory_map=True).names
+            columns = [col for col in columns if col in available]
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select([col for col in columns if col in table.column_names])
+        return table.to_pandas()
+
+
+def iter_scenarios(store_dir, columns=None):
+    """按写入顺序逐个产出 (方案名称, DataFrame)，columns 指定只读取的列"""
+    _require_pyarrow()
+    for entry in read_manifest(store_dir)['scenarios']:
+        yield entry['name'], _read_table(os.path.join(store_dir, entry['file']), columns)
+
+
+def read_scenario(store_dir, name, columns=None):
+    """读取单个方案的数据"""
+    _require_pyarrow()
+    for entry in read_manifest(store_dir)['scenarios']:
+        if entry['name'] == name:
+            return _read_table(os.path.join(store_dir, entry['file']), columns)
+    raise KeyError(name)
+
+
+def export_store_to_excel(store_dir, output_file):
+    """将列式中间数据导出为Excel，每个方案一个工作表，返回导出的工作表数量"""
+    names = [entry['name'] for entry in read_manifest(store_dir)['scenarios']]
+    writer = StreamingExcelWriter(output_file, reserved_names=names)
+    count = 0
+    for name, df in iter_scenarios(store_dir):
+        writer.write(name, df)
+        count += 1
+    writer.close()
+    return count
@@ -0,0 +1,282 @@
+"""基准测试：用合成数据无界面地计时各工具的公开函数，并与保存的基准结果比较
+
+用法（在仓库根目录下）：
+    python benchmarks/RunBenchmarks.py [--size small|medium|large | --elements N]
+                                       [--workers N] [--repeat N] [--only 名称 ...]
+                                       [--save-baseline] [--tolerance 0.2]
+
+数据规模：small 为1万个单元，medium 为20万个，large 为200万个。合成数据生成后缓存在
+--data-dir 中（默认 benchmarks/_data），再次运行直接复用。
+
+基准结果按单元数保存在 benchmarks/baselines.json 中（--save-baseline 写入或更新），
+任一项目比基准慢超过 tolerance 时退出码为1。仓库中附带的是一台单核开发机上 small 规模
+的参考结果，只能粗略参考；不同机器的耗时不可比，在新机器上应先运行一次
+    python benchmarks/RunBenchmarks.py --save-baseline
+保存本机基准，之后的运行才有意义。基准文件中没有的项目只计时、不比较。
+
+栅格化项目需要安装 rasterio，未安装时跳过。
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import time
+import warnings
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import ShpEncoding  # noqa: E402
+from CoordinateConverter import convert_coordinate_file  # noqa: E402
+from DataSplit import split_csv_by_station  # noqa: E402
+from MeshClip import load_mesh_clipper  # noqa: E402
+from SBH import extract_shp_to_excel as sbh_extract_shp_to_excel  # noqa: E402
+from ThiessenCore import generate_thiessen_polygons  # noqa: E402
+from ThiessenWeights import clear_mask_cache, compute_areal_rainfall  # noqa: E402
+from ZonesCore import (extract_shp_to_excel, generate_analysis_table, generate_envelope_layer,  # noqa: E402
+                       rasterize_zones)
+from ZonesRaster import rasterio  # noqa: E402
+
+from SyntheticData import CELL_SIZE, generate_dataset  # noqa: E402
+
+
+SIZES = {'small': 10000, 'medium': 200000, 'large': 2000000}
+DEFAULT_DATA_DIR = os.path.join(ROOT_DIR, 'benchmarks', '_data')
+DEFAULT_BASELINE_FILE = os.path.join(ROOT_DIR, 'benchmarks', 'baselines.json')
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def _zones_shp_files(ctx):
+    folder = ctx['paths']['zones']
+    return [os.path.join(folder, name, '2D Zones.shp') for name in sorted(os.listdir(folder))]
+
+
+def _bench_resolve_encoding(ctx):
+    ShpEncoding._encoding_cache.clear()
+    for shp_path in _zones_shp_files(ctx):
+        ShpEncoding.resolve_shp_encoding(shp_path)
+
+
+def _bench_load_mesh_clipper(ctx):
+    load_mesh_clipper(ctx['paths']['mesh'], use_cache=False)
+
+
+def _bench_extract(ctx):
+    extract_shp_to_excel(ctx['paths']['zones'], ctx['out']('extract.xlsx'))
+
+
+def _bench_extract_parallel(ctx):
+    extract_shp_to_excel(ctx['paths']['zones'], ctx['out']('extract_parallel.xlsx'), max_workers=ctx['workers'])
+
+
+def _bench_extract_chunked(ctx):
+    # 每个方案分为4批
+    extract_shp_to_excel(ctx['paths']['zones'], ctx['out']('extract_chunked.xlsx'), True, ctx['paths']['mesh'],
+                         max_workers=ctx['workers'], chunk_size=-(-ctx['elements'] // 4))
+
+
+def _bench_extract_clip(ctx):
+    extract_shp_to_excel(ctx['paths']['zones'], ctx['out']('extract_clip.xlsx'), True, ctx['paths']['mesh'],
+                         max_workers=ctx['workers'], use_clip_cache=False)
+
+
+def _bench_extract_store(ctx):
+    extract_shp_to_excel(ctx['paths']['zones'], '', store_dir=ctx['out']('store'), max_workers=ctx['workers'])
+
+
+def _bench_extract_and_analyse(ctx):
+    extract_shp_to_excel(ctx['paths']['zones'], ctx['out']('fused.xlsx'), max_workers=ctx['workers'],
+                         analysis_output_file=ctx['out']('fused_analysis.xlsx'), project_object='基准测试')
+
+
+def _bench_analysis_excel(ctx):
+    generate_analysis_table(ctx['out']('extract.xlsx'), ctx['out']('analysis.xlsx'), '基准测试',
+                            raise_errors=True)
+
+
+def _bench_analysis_store(ctx):
+    generate_analysis_table(ctx['out']('store'), ctx['out']('analysis_store.xlsx'), '基准测试',
+                            raise_errors=True)
+
+
+def _bench_envelope(ctx):
+    generate_envelope_layer(ctx['paths']['zones'], ctx['out']('envelope.shp'), raise_errors=True)
+
+
+def _bench_rasterize(ctx):
+    # 像元边长与单元边长相同
+    rasterize_zones(ctx['paths']['zones'], ctx['out']('raster'), CELL_SIZE, max_workers=ctx['workers'],
+                    raise_errors=True)
+
+
+def _bench_sbh_extract(ctx):
+    sbh_extract_shp_to_excel(ctx['paths']['zones'], ctx['out']('sbh.xlsx'))
+
+
+def _bench_thiessen(ctx):
+    output_folder = ctx['out']('thiessen')
+    shutil.rmtree(output_folder, ignore_errors=True)
+    generate_thiessen_polygons(ctx['paths']['subbasins'], ctx['paths']['rain_gauges'], output_folder,
+                               name_field='Name')
+
+
+def _bench_thiessen_parallel(ctx):
+    output_folder = ctx['out']('thiessen_parallel')
+    shutil.rmtree(output_folder, ignore_errors=True)
+    generate_thiessen_polygons(ctx['paths']['subbasins'], ctx['paths']['rain_gauges'], output_folder,
+                               name_field='Name', max_workers=ctx['workers'])
+
+
+def _bench_areal_rainfall(ctx):
+    compute_areal_rainfall(ctx['paths']['subbasins'], ctx['paths']['rain_gauges'], ctx['paths']['gauge_series'],
+                           '时间', '雨量(mm)', use_cache=False)
+
+
+def _bench_areal_rainfall_dynamic(ctx):
+    # 清空动态权重缓存，每次都计入各雨量站组合的泰森多边形生成时间
+    clear_mask_cache()
+    compute_areal_rainfall(ctx['paths']['subbasins'], ctx['paths']['rain_gauges'], ctx['paths']['gauge_series'],
+                           '时间', '雨量(mm)', use_cache=False, dynamic=True)
+
+
+def _bench_coordinate_convert(ctx):
+    convert_coordinate_file(ctx['paths']['xy_table'], ctx['out']('xy_converted.xlsx'), "CGCS2000 117°E",
+                            "WGS1984", log=_quiet)
+
+
+def _bench_split_csv(ctx):
+    output_folder = ctx['out']('split')
+    shutil.rmtree(output_folder, ignore_errors=True)
+    split_csv_by_station(ctx['paths']['station_csv'], '站名', output_folder)
+
+
+# (名称, 函数)，按顺序执行；analysis_excel 和 analysis_store 分别使用 extract 和 extract_store 的输出
+BENCHMARKS = [
+    ('resolve_encoding', _bench_resolve_encoding),
+    ('load_mesh_clipper', _bench_load_mesh_clipper),
+    ('extract', _bench_extract),
+    ('extract_parallel', _bench_extract_parallel),
+    ('extract_clip', _bench_extract_clip),
+    ('extract_chunked', _bench_extract_chunked),
+    ('extract_store', _bench_extract_store),
+    ('extract_and_analyse', _bench_extract_and_analyse),
+    ('analysis_excel', _bench_analysis_excel),
+    ('analysis_store', _bench_analysis_store),
+    ('envelope', _bench_envelope),
+    ('rasterize', _bench_rasterize),
+    ('sbh_extract', _bench_sbh_extract),
+    ('thiessen', _bench_thiessen),
+    ('thiessen_parallel', _bench_thiessen_parallel),
+    ('areal_rainfall', _bench_areal_rainfall),
+    ('areal_rainfall_dynamic', _bench_areal_rainfall_dynamic),
+    ('coordinate_convert', _bench_coordinate_convert),
+    ('split_csv', _bench_split_csv),
+]
+
+if rasterio is None:
+    # 未安装 rasterio 时无法栅格化
+    BENCHMARKS = [item for item in BENCHMARKS if item[0] != 'rasterize']
+
+# 依赖其他项目输出的项目
+_DEPENDENCIES = {'analysis_excel': 'extract', 'analysis_store': 'extract_store'}
+
+
+def run_benchmark(func, ctx, repeat):
+    """执行 repeat 次并返回各次耗时（秒），函数的打印输出和警告被丢弃"""
+    timings = []
+    for _ in range(repeat):
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull), \
+                warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            start = time.perf_counter()
+            func(ctx)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="用合成数据对各工具进行基准测试")
+    parser.add_argument('--size', choices=SIZES, default='small', help="数据规模")
+    parser.add_argument('--elements', type=int, help="每个方案的单元数，指定时覆盖 --size")
+    parser.add_argument('--scenarios', type=int, default=3, help="方案数量")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help="并行项目使用的进程数")
+    parser.add_argument('--repeat', type=int, default=3, help="每个项目的重复次数，取最短耗时")
+    parser.add_argument('--only', action='append', metavar='名称', help="只执行指定项目，可重复指定")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="合成数据及输出的缓存目录")
+    parser.add_argument('--baseline-file', default=DEFAULT_BASELINE_FILE, help="基准结果文件")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为基准")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许比基准慢的比例")
+    args = parser.parse_args(argv)
+
+    n_elements = args.elements or SIZES[args.size]
+    names = [name for name, _ in BENCHMARKS]
+    selected = args.only or names
+    unknown = sorted(set(selected) - set(names))
+    if unknown:
+        print(f"未知的项目：{', '.join(unknown)}", file=sys.stderr)
+        return 2
+    # 自动加入被依赖的项目
+    selected = set(selected) | {_DEPENDENCIES[name] for name in selected if name in _DEPENDENCIES}
+
+    data_dir = os.path.join(args.data_dir, f"{n_elements}x{args.scenarios}")
+    output_dir = os.path.join(data_dir, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    ctx = {
+        'paths': generate_dataset(data_dir, n_elements, args.scenarios),
+        'workers': args.workers,
+        'elements': n_elements,
+        'out': lambda name: os.path.join(output_dir, name),
+    }
+
+    key = str(n_elements) if args.scenarios == 3 else f"{n_elements}x{args.scenarios}"
+    baselines = load_baselines(args.baseline_file)
+    baseline = baselines.get(key, {})
+
+    results = {}
+    regressions = []
+    print(f"{'项目':<22}{'最短(s)':>10}{'中位(s)':>10}{'基准(s)':>10}{'比值':>8}")
+    for name, func in BENCHMARKS:
+        if name not in selected:
+            continue
+        timings = run_benchmark(func, ctx, args.repeat)
+        best = min(timings)
+        results[name] = best
+        line = f"{name:<24}{best:>10.3f}{statistics.median(timings):>10.3f}"
+        if name in baseline:
+            ratio = best / baseline[name] if baseline[name] > 0 else float('inf')
+            line += f"{baseline[name]:>10.3f}{ratio:>8.2f}"
+            if ratio > 1 + args.tolerance:
+                regressions.append(name)
+                line += "  变慢"
+        print(line)
+
+    if args.save_baseline:
+        baselines[key] = dict(baseline, **results)
+        with open(args.baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2)
+        print(f"基准结果已保存至：{args.baseline_file}")
+
+    if regressions:
+        print(f"以下项目比基准慢超过 {args.tolerance:.0%}：{', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
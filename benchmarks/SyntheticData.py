@@ -0,0 +1,207 @@
+"""基准测试用的合成数据生成器
+
+生成的数据与实际工程数据的字段结构一致：
+- 2D Zones.shp：规则网格单元，包含 element_no、AREA2D、DEPTH2D、T_FLOOD_DU、T_INUDATIO、T_PEAK_2D
+  等字段，水深和时间为空间上连续变化的场，多个方案共用同一套网格
+- 网格化区间面文件：若干跨越单元边界的圆形区域，用于裁剪
+- 泰森多边形的面文件（子流域）和雨量站点文件
+- 坐标转换的X、Y点表（CGCS2000 117°E）
+- 按测站拆分的大型CSV文件
+- 与雨量站对应的逐时雨量序列（每站一个CSV文件，部分雨量站有缺测时段），用于面雨量计算
+
+同一组参数总是生成相同的数据（固定随机种子）。
+"""
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# 合成数据所用的坐标系（CGCS2000 3度带 117°E）及网格原点
+CRS = 'EPSG:4547'
+ORIGIN_X = 400000.0
+ORIGIN_Y = 3100000.0
+# 单元边长（m）
+CELL_SIZE = 10.0
+
+
+def _grid_shape(n_elements):
+    nx = int(np.ceil(np.sqrt(n_elements)))
+    ny = int(np.ceil(n_elements / nx))
+    return nx, ny
+
+
+def extent(n_elements):
+    """n_elements 个单元的网格范围 (xmin, ymin, xmax, ymax)"""
+    nx, ny = _grid_shape(n_elements)
+    return ORIGIN_X, ORIGIN_Y, ORIGIN_X + nx * CELL_SIZE, ORIGIN_Y + ny * CELL_SIZE
+
+
+def make_zones(n_elements, scenario=0, seed=0):
+    """生成一个方案的2D Zones数据"""
+    rng = np.random.default_rng(seed + scenario)
+    nx, _ = _grid_shape(n_elements)
+    index = np.arange(n_elements)
+    col = index % nx
+    row = index // nx
+    x0 = ORIGIN_X + col * CELL_SIZE
+    y0 = ORIGIN_Y + row * CELL_SIZE
+    geometry = shapely.box(x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE)
+
+    # 水深为从河道（网格中线）向两侧递减的连续场，不同方案整体抬高，叠加少量噪声
+    u = col / max(nx - 1, 1)
+    v = row / max(row.max(), 1)
+    depth = (4.0 - 6.0 * np.abs(u - 0.5 - 0.1 * np.sin(6 * v)) + 0.5 * scenario
+             + rng.normal(0, 0.2, n_elements))
+    depth = np.clip(depth, 0, None).round(3)
+    arrival = (v * 20 + np.abs(u - 0.5) * 10 + rng.uniform(0, 1, n_elements)) * 3600
+    duration = np.where(depth > 0, (depth * 6 + rng.uniform(0, 2, n_elements)) * 3600, 0)
+    peak = arrival + duration / 2
+
+    return gpd.GeoDataFrame({
+        'element_no': index + 1,
+        'AREA2D': np.full(n_elements, CELL_SIZE * CELL_SIZE),
+        'DEPTH2D': depth,
+        'T_FLOOD_DU': duration.round(1),
+        'T_INUDATIO': arrival.round(1),
+        'T_PEAK_2D': peak.round(1),
+        'VELOCITY2D': (depth * 0.3).round(3),
+        'ZONE_NAME': np.where(depth > 0, '淹没区', '未淹没'),
+    }, geometry=geometry, crs=CRS)
+
+
+def write_zones(folder, n_elements, n_scenarios=3, seed=0, encoding='gbk'):
+    """在 folder 下生成 方案1、方案2… 子文件夹，每个包含一个2D Zones.shp"""
+    for scenario in range(n_scenarios):
+        scenario_dir = os.path.join(folder, f"方案{scenario + 1}")
+        os.makedirs(scenario_dir, exist_ok=True)
+        make_zones(n_elements, scenario, seed).to_file(os.path.join(scenario_dir, '2D Zones.shp'),
+                                                     encoding=encoding)
+
+
+def make_clip_mesh(n_elements, n_polygons=8, seed=0):
+    """生成若干圆形网格化区间，总面积约为网格范围的15%"""
+    rng = np.random.default_rng(seed + 100)
+    xmin, ymin, xmax, ymax = extent(n_elements)
+    radius = np.sqrt(0.15 * (xmax - xmin) * (ymax - ymin) / (n_polygons * np.pi))
+    x = rng.uniform(xmin + radius, xmax - radius, n_polygons)
+    y = rng.uniform(ymin + radius, ymax - radius, n_polygons)
+    geometry = shapely.buffer(shapely.points(x, y), radius, quad_segs=16)
+    return gpd.GeoDataFrame({'ID': np.arange(n_polygons) + 1}, geometry=geometry, crs=CRS)
+
+
+def make_subbasins(n_elements, n_basins=16, seed=0):
+    """将网格范围划分为 n_basins 个略有扰动的四边形子流域"""
+    rng = np.random.default_rng(seed + 200)
+    xmin, ymin, xmax, ymax = extent(n_elements)
+    k = int(np.ceil(np.sqrt(n_basins)))
+    xs = np.linspace(xmin, xmax, k + 1)
+    ys = np.linspace(ymin, ymax, k + 1)
+    gx, gy = np.meshgrid(xs, ys)
+    # 内部节点随机扰动，使子流域边界不与网格对齐
+    jitter = 0.2 * (xmax - xmin) / k
+    gx[1:-1, 1:-1] += rng.uniform(-jitter, jitter, gx[1:-1, 1:-1].shape)
+    gy[1:-1, 1:-1] += rng.uniform(-jitter, jitter, gy[1:-1, 1:-1].shape)
+
+    polygons, names = [], []
+    for j in range(k):
+        for i in range(k):
+            ring = [(gx[j, i], gy[j, i]), (gx[j, i + 1], gy[j, i + 1]),
+                    (gx[j + 1, i + 1], gy[j + 1, i + 1]), (gx[j + 1, i], gy[j + 1, i])]
+            polygons.append(shapely.Polygon(ring))
+            names.append(f"子流域{len(names) + 1}")
+    return gpd.GeoDataFrame({'Name': names}, geometry=polygons, crs=CRS)
+
+
+def make_rain_gauges(n_elements, n_gauges=40, seed=0):
+    """在网格范围内及其周边随机布置雨量站"""
+    rng = np.random.default_rng(seed + 300)
+    xmin, ymin, xmax, ymax = extent(n_elements)
+    margin = 0.1 * (xmax - xmin)
+    x = rng.uniform(xmin - margin, xmax + margin, n_gauges)
+    y = rng.uniform(ymin - margin, ymax + margin, n_gauges)
+    return gpd.GeoDataFrame({
+        'ID': np.arange(n_gauges) + 1,
+        'Name': [f"雨量站{i + 1}" for i in range(n_gauges)],
+    }, geometry=shapely.points(x, y), crs=CRS)
+
+
+def make_xy_table(n_points, seed=0):
+    """生成CGCS2000 117°E坐标的X、Y点表，包含少量无效行"""
+    rng = np.random.default_rng(seed + 400)
+    df = pd.DataFrame({
+        '名称': [f"点{i + 1}" for i in range(n_points)],
+        'X': rng.uniform(350000, 650000, n_points).round(3),
+        'Y': rng.uniform(2900000, 3300000, n_points).round(3),
+    })
+    df['X'] = df['X'].astype(object)
+    df.loc[::997, 'X'] = '无效'
+    return df
+
+
+def make_station_csv(path, n_rows, n_stations=50, seed=0):
+    """生成包含多个测站时间序列的CSV文件，测站列名为“站名”"""
+    rng = np.random.default_rng(seed + 500)
+    per_station = int(np.ceil(n_rows / n_stations))
+    times = pd.date_range('2020-06-01', periods=per_station, freq='h').strftime('%Y-%m-%d %H:%M')
+    df = pd.DataFrame({
+        '站名': np.repeat([f"测站{i + 1}" for i in range(n_stations)], per_station)[:n_rows],
+        '时间': np.tile(times, n_stations)[:n_rows],
+        '雨量(mm)': rng.gamma(0.5, 4, n_rows).round(1),
+        '水位(m)': (20 + rng.normal(0, 1, n_rows)).round(2),
+    })
+    df.to_csv(path, index=False, encoding='utf-8')
+
+
+def write_gauge_series(folder, n_hours, n_gauges=40, seed=0):
+    """为 make_rain_gauges 的各雨量站写出逐时雨量CSV（文件名为雨量站名称）
+
+    约四分之一的雨量站有若干段缺测（空值），使动态权重需要处理多种雨量站有无数据的组合。
+    """
+    rng = np.random.default_rng(seed + 600)
+    os.makedirs(folder, exist_ok=True)
+    times = pd.date_range('2015-01-01', periods=n_hours, freq='h').strftime('%Y-%m-%d %H:%M')
+    for i in range(n_gauges):
+        rainfall = rng.gamma(0.3, 5, n_hours).round(1)
+        if i % 4 == 0:
+            for start in rng.integers(0, n_hours, 5):
+                rainfall[start:start + rng.integers(6, 72)] = np.nan
+        pd.DataFrame({'时间': times, '雨量(mm)': rainfall}).to_csv(
+            os.path.join(folder, f"雨量站{i + 1}.csv"), index=False, encoding='utf-8')
+
+
+def generate_dataset(root, n_elements, n_scenarios=3, seed=0):
+    """生成一整套基准测试数据，已存在时直接复用，返回各数据的路径字典"""
+    paths = {
+        'zones': os.path.join(root, 'zones'),
+        'mesh': os.path.join(root, 'mesh', 'mesh.shp'),
+        'subbasins': os.path.join(root, 'thiessen', 'subbasins.shp'),
+        'rain_gauges': os.path.join(root, 'thiessen', 'rain_gauges.shp'),
+        'xy_table': os.path.join(root, 'xy.xlsx'),
+        'station_csv': os.path.join(root, 'stations.csv'),
+        'gauge_series': os.path.join(root, 'thiessen', 'gauge_series'),
+    }
+    done_flag = os.path.join(root, '.complete')
+    if os.path.exists(done_flag):
+        # 早于雨量序列加入的缓存数据只补充生成雨量序列
+        if not os.path.isdir(paths['gauge_series']):
+            write_gauge_series(paths['gauge_series'], min(n_elements, 87600), seed=seed)
+        return paths
+
+    os.makedirs(root, exist_ok=True)
+    print(f"正在生成 {n_elements} 个单元、{n_scenarios} 个方案的合成数据：{root}")
+    write_zones(paths['zones'], n_elements, n_scenarios, seed)
+    for key in ('mesh', 'subbasins'):
+        os.makedirs(os.path.dirname(paths[key]), exist_ok=True)
+    make_clip_mesh(n_elements, seed=seed).to_file(paths['mesh'], encoding='utf-8')
+    make_subbasins(n_elements, seed=seed).to_file(paths['subbasins'], encoding='utf-8')
+    make_rain_gauges(n_elements, seed=seed).to_file(paths['rain_gauges'], encoding='utf-8')
+    # 点表和测站数据的规模随单元数变化，但有上限，避免Excel和CSV生成本身耗时过长
+    make_xy_table(min(n_elements, 200000), seed).to_excel(paths['xy_table'], index=False)
+    make_station_csv(paths['station_csv'], min(n_elements * 2, 2000000), seed=seed)
+    # 雨量序列最长为10年逐时
+    write_gauge_series(paths['gauge_series'], min(n_elements, 87600), seed=seed)
+    with open(done_flag, 'w') as f:
+        f.write(str(n_elements))
+    return paths
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ThiessenWeights import ThiessenWeights  # noqa: E402
+
+
+def test_missing_station_only_affects_basins_using_it():
+    # 4个子流域、3个雨量站：s3 只在 b4 中有面积
+    weights = ThiessenWeights(['b1', 'b2', 'b3', 'b4'], ['s1', 's2', 's3'],
+                              rows=[0, 1, 1, 2, 3, 3], cols=[0, 0, 1, 1, 1, 2],
+                              areas=[1.0, 1.0, 3.0, 2.0, 1.0, 1.0])
+    series = pd.DataFrame({'s1': [10.0, 10.0], 's2': [2.0, 2.0], 's3': [np.nan, 4.0]})
+
+    rainfall = weights.areal_rainfall(series)
+
+    assert np.isnan(rainfall.loc[0, 'b4'])
+    assert np.isfinite(rainfall.loc[0, ['b1', 'b2', 'b3']]).all()
+    np.testing.assert_allclose(rainfall.loc[0, ['b1', 'b2', 'b3']], [10.0, 4.0, 2.0])
+    np.testing.assert_allclose(rainfall.loc[1], [10.0, 4.0, 2.0, 3.0])